@@ -14,6 +14,7 @@ const LocationPage = () => {
     const [isLoading, setIsLoading] = useState(true);
     const [loadingText, setLoadingText] = useState("데이터를 불러오는 중..."); // 진행 상태 메시지 추가
     const [error, setError] = useState<string | null>(null);
+    const [previewImage, setPreviewImage] = useState<string | null>(null); // 저품질 미리보기 합성 결과
 
     useEffect(() => {
         const fetchImageData = async () => {
@@ -42,36 +43,36 @@ const LocationPage = () => {
         fetchImageData();
     }, []);
 
-    // 서버의 작업 상태를 체크하는 폴링 함수 (새로 추가)
-    const pollTaskStatus = async (taskId: string): Promise<any> => {
-        return new Promise((resolve, reject) => {
-            const interval = setInterval(async () => {
-                try {
-                    const response = await fetch(`${NGROK_URL}/task_status/${taskId}`, {
-                        headers: { 'ngrok-skip-browser-warning': '69420' }
-                    });
-                    const data = await response.json();
-
-                    if (data.status === 'completed') {
-                        clearInterval(interval);
-                        resolve(data.result);
-                    } else if (data.status === 'failed') {
-                        clearInterval(interval);
-                        reject(new Error(data.error || 'Task failed'));
-                    }
-                } catch (err) {
-                    clearInterval(interval);
-                    reject(err);
-                }
-            }, 3000); // 3초 간격
-        });
+    // 서버 작업 상태 확인용 공통 함수 (long-poll: 서버가 상태가 바뀔 때까지 최대 25초 기다렸다가 응답)
+    // status 'preview' 이면 onPreview 로 미리보기 결과를 넘기고 'completed' 가 될 때까지 계속 확인
+    const pollTaskStatus = async (taskId: string, onPreview?: (result: any) => void): Promise<any> => {
+        let since = 0;
+        while (true) {
+            const response = await fetch(`${NGROK_URL}/task_status/${taskId}?wait=25&since=${since}`, {
+                headers: { 'ngrok-skip-browser-warning': '69420' },
+            });
+            const data = await response.json();
+
+            if (data.status === 'completed') return data.result;
+            if (data.status === 'failed') throw new Error(data.error || 'Task failed');
+            if (!response.ok) throw new Error(data.error || 'Task not found');
+            if (data.status === 'preview' && data.result && onPreview) onPreview(data.result);
+
+            if (typeof data.version === 'number') {
+                since = data.version;
+            } else {
+                // long-poll 을 지원하지 않는 서버: 기존처럼 3초 간격으로 확인
+                await new Promise((resolve) => setTimeout(resolve, 3000));
+            }
+        }
     };
 
     const processDiffusionImage = async (
         imageUrl: string,
         maskUrl: string,
         referenceUrl: string,
-        outputDir: string
+        outputDir: string,
+        onPreview?: (result: any) => void
     ) => {
         // const response = await fetch('http://localhost:8080/process_image', { 로컬에서 실행할 시
         const response = await fetch(`${NGROK_URL}/process_image`, {
@@ -87,6 +88,7 @@ const LocationPage = () => {
                 output_dir: outputDir,
                 seed: 321,
                 scale: 20,
+                quality: "preview", // 적은 step 의 미리보기를 먼저 받고 전체 품질 결과를 기다림
             }),
         });
 
@@ -96,7 +98,7 @@ const LocationPage = () => {
 
         // 비동기 task_id를 받아 폴링 시작
         const { task_id } = await response.json();
-        return await pollTaskStatus(task_id);
+        return await pollTaskStatus(task_id, onPreview);
     };
 
     const handleIconClick = async (clusterId: number) => {
@@ -136,10 +138,15 @@ const LocationPage = () => {
                     latestImage.s3_url,
                     maskImageUrl,
                     lampUrls[i],
-                    `lamp${i + 1}_results`
+                    `lamp${i + 1}_results`,
+                    (preview) => {
+                        setPreviewImage(preview.s3_processed_image_path);
+                        setLoadingText(`조명 ${i + 1} 미리보기 완료, 고화질로 합성 중...`);
+                    }
                 );
                 results.push(res);
             }
+            setPreviewImage(null);
 
             console.log('Response from processDiffusionImage (after polling):', results); // 응답 내용 출력
 
@@ -177,13 +184,22 @@ const LocationPage = () => {
             console.error('Error details:', err instanceof Error ? err.stack : 'No stack available');
             setError(err instanceof Error ? err.message : 'Unknown error occurred');
         } finally {
+            setPreviewImage(null);
             setIsLoading(false); // 로딩 상태 해제
         }
     };
 
     if (isLoading) {
         return <div className="flex flex-col justify-center items-center min-h-screen bg-black text-white">
-            <div className="animate-spin rounded-full h-32 w-32 border-b-2 border-white mb-4"></div>
+            {previewImage ? (
+                <img
+                    src={previewImage}
+                    alt="합성 미리보기"
+                    className="w-[320px] h-[320px] object-cover rounded-md mb-4"
+                />
+            ) : (
+                <div className="animate-spin rounded-full h-32 w-32 border-b-2 border-white mb-4"></div>
+            )}
             <p>{loadingText}</p>
         </div>;
     }
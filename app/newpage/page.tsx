@@ -35,29 +35,26 @@ const NewPage = () => {
         fetchLatestImage();
     }, []);
 
-    // 서버 작업 상태 확인용 공통 폴링 함수
+    // 서버 작업 상태 확인용 공통 함수 (long-poll: 서버가 상태가 바뀔 때까지 최대 25초 기다렸다가 응답)
     const pollTaskStatus = async (taskId: string): Promise<any> => {
-        return new Promise((resolve, reject) => {
-            const interval = setInterval(async () => {
-                try {
-                    const response = await fetch(`${NGROK_URL}/task_status/${taskId}`, {
-                        headers: { "ngrok-skip-browser-warning": "69420" },
-                    });
-                    const data = await response.json();
-
-                    if (data.status === "completed") {
-                        clearInterval(interval);
-                        resolve(data.result);
-                    } else if (data.status === "failed") {
-                        clearInterval(interval);
-                        reject(new Error(data.error || "Task failed"));
-                    }
-                } catch (err) {
-                    clearInterval(interval);
-                    reject(err);
-                }
-            }, 3000);
-        });
+        let since = 0;
+        while (true) {
+            const response = await fetch(`${NGROK_URL}/task_status/${taskId}?wait=25&since=${since}`, {
+                headers: { "ngrok-skip-browser-warning": "69420" },
+            });
+            const data = await response.json();
+
+            if (data.status === "completed") return data.result;
+            if (data.status === "failed") throw new Error(data.error || "Task failed");
+            if (!response.ok) throw new Error(data.error || "Task not found");
+
+            if (typeof data.version === "number") {
+                since = data.version;
+            } else {
+                // long-poll 을 지원하지 않는 서버: 기존처럼 3초 간격으로 확인
+                await new Promise((resolve) => setTimeout(resolve, 3000));
+            }
+        }
     };
 
     const handleViewRecommendation = async () => {
@@ -71,7 +68,8 @@ const NewPage = () => {
                     "Content-Type": "application/json",
                     "ngrok-skip-browser-warning": "69420",
                 },
-                body: JSON.stringify({ image_url: latestImage?.s3_url }) // 필요 시 바디 추가
+                // 분석할 이미지를 명시해 동시에 업로드된 다른 이미지와 섞이지 않도록 함
+                body: JSON.stringify({ image_name: latestImage?.image_name, image_url: latestImage?.s3_url })
             });
 
             if (!flaskResponse.ok) {
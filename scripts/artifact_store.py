@@ -0,0 +1,237 @@
+"""모델 가중치 / latent bank 로컬 아티팩트 저장소
+
+higan 과 diffusion 서비스가 함께 사용하는 다운로드 캐시입니다.
+
+- 파일 옆에 `<name>.sha256` 메타 파일(크기, mtime, sha256)을 두어, 이후 실행에서는
+  `stat` 한 번과 기록된 해시 비교만으로 검증합니다. 크기/mtime 이 바뀌면 다시 해시해
+  기록된 해시와 비교하며, 다르면 메타를 덮어쓰지 않고 검증에 실패합니다.
+  (고정된 기대 sha256 이 없는 아티팩트는 처음 검증된 다운로드의 해시가 기준입니다.)
+- 다운로드는 `<name>.part` 임시 파일에 받은 뒤 크기(서버가 알려 준 전체 크기)와 기대 sha256 을
+  확인하고 `os.replace` 로 교체합니다. 이미 끝까지 받은 `.part` (HTTP 416) 도 같은 검증을 거칩니다.
+- 중단된 `.part` 파일이 있으면 HTTP Range 요청으로 이어받습니다.
+- 기대 sha256 이 없는 아티팩트는, 메타 파일 없이 남아 있던 파일을 처음 채택할 때 서버의 크기와 비교해
+  잘린 파일을 유효한 파일로 기록하지 않도록 합니다.
+- 오프라인 모드(`ARTIFACT_OFFLINE=1`)에서는 파일이 없거나 손상되면 다운로드하지 않고 바로 실패합니다.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import requests
+
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = (10, 60)  # (connect, read) 초
+
+
+class ArtifactError(Exception):
+    """아티팩트를 준비할 수 없을 때 발생하는 예외"""
+
+
+class ArtifactMissingError(ArtifactError):
+    """오프라인 모드에서 아티팩트가 없거나 검증에 실패했을 때 발생하는 예외"""
+
+
+class Artifact:
+    """다운로드 URL 과 저장 경로, (알고 있다면) 기대 sha256 을 묶은 항목"""
+
+    def __init__(self, name, url, path, sha256=None):
+        self.name = name
+        self.url = url
+        self.path = path
+        self.sha256 = sha256
+
+    def __repr__(self):
+        return f"Artifact({self.name!r}, path={self.path!r})"
+
+
+def is_offline():
+    return os.getenv('ARTIFACT_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _meta_path(path):
+    return f"{path}.sha256"
+
+
+def _read_meta(path):
+    try:
+        with open(_meta_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(path, sha256):
+    st = os.stat(path)
+    meta = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+    # 여러 스레드/프로세스가 동시에 기록해도 서로의 임시 파일을 덮어쓰지 않도록 고유한 이름 사용
+    directory, filename = os.path.split(os.path.abspath(_meta_path(path)))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, _meta_path(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def recorded_sha256(path):
+    """파일의 sha256 을 반환합니다.
+
+    메타 파일의 크기/mtime 이 현재 파일과 같으면 기록된 해시를 그대로 사용하고,
+    다르면(혹은 메타가 없으면) 한 번 해시를 계산합니다. 계산한 해시가 기록된 해시와 같거나 메타가
+    없을 때만 메타를 갱신하고, 내용이 바뀐 파일은 메타를 그대로 두어 verify 가 실패하도록 합니다.
+    파일이 없으면 None 입니다.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    meta = _read_meta(path)
+    if meta and meta.get("size") == st.st_size and meta.get("mtime_ns") == st.st_mtime_ns:
+        return meta.get("sha256")
+    sha256 = file_sha256(path)
+    if meta and meta.get("sha256") not in (None, sha256):
+        print(f"{path} 내용이 기록된 해시와 다릅니다: {sha256} != {meta['sha256']}")
+        return sha256
+    _write_meta(path, sha256)
+    return sha256
+
+
+def verify(artifact):
+    """로컬 파일이 존재하고 기대 해시(없으면 메타에 기록된 해시)와 일치하는지 확인합니다."""
+    meta = _read_meta(artifact.path)
+    sha256 = recorded_sha256(artifact.path)
+    if sha256 is None:
+        return False
+
+    expected = artifact.sha256 or (meta or {}).get("sha256")
+    if expected is not None and sha256 != expected:
+        print(f"{artifact.name} 해시 불일치: {sha256} != {expected}")
+        return False
+    if meta and meta.get("sha256") != sha256:
+        # 고정된 해시와 일치하는 파일이므로 오래된 메타를 교체
+        _write_meta(artifact.path, sha256)
+    return True
+
+
+def _total_size(response):
+    """응답에서 파일 전체 크기를 구합니다 (알 수 없으면 None)."""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    # Content-Encoding 이 있으면 Content-Length 는 압축된 크기이므로 사용하지 않음
+    if response.status_code == 200 and length and length.isdigit() and not response.headers.get('Content-Encoding'):
+        return int(length)
+    return None
+
+
+def remote_size(url):
+    """HEAD 요청으로 원격 파일 크기를 구합니다 (알 수 없으면 None)."""
+    try:
+        r = requests.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        print(f"원격 파일 크기 확인 실패 ({url}): {e}")
+        return None
+    length = r.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+def _verify_part(artifact, part_path, total_size):
+    """받은 `.part` 의 크기와 (기대 해시가 있다면) sha256 을 확인합니다. 실패하면 `.part` 를 지웁니다."""
+    size = os.path.getsize(part_path)
+    if total_size is not None and size != total_size:
+        os.remove(part_path)
+        raise ArtifactError(f"{artifact.name} 다운로드 크기 불일치: {size} != {total_size}")
+
+    sha256 = file_sha256(part_path)
+    if artifact.sha256 is not None and sha256 != artifact.sha256:
+        os.remove(part_path)
+        raise ArtifactError(f"{artifact.name} 다운로드 해시 불일치: {sha256} != {artifact.sha256}")
+    return sha256
+
+
+def _download(artifact):
+    """`.part` 파일로 이어받기 다운로드 후 크기/해시를 검증하고 원자적으로 교체합니다."""
+    part_path = f"{artifact.path}.part"
+    os.makedirs(os.path.dirname(os.path.abspath(artifact.path)), exist_ok=True)
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with requests.get(artifact.url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT) as r:
+        total_size = _total_size(r)
+        if r.status_code == 416:
+            # 이미 끝까지 받은 .part 파일: 확인할 기준(전체 크기나 기대 해시)이 없으면 처음부터 다시 받습니다.
+            if total_size is None and artifact.sha256 is None:
+                print(f"{artifact.name}: 기존 .part 파일을 검증할 수 없어 처음부터 다운로드합니다.")
+                os.remove(part_path)
+                return _download(artifact)
+            print(f"{artifact.name}: 이미 받은 .part 파일을 검증합니다.")
+        else:
+            r.raise_for_status()
+            if offset and r.status_code != 206:
+                # 서버가 Range 를 지원하지 않으면 처음부터 다시 받습니다.
+                print(f"{artifact.name}: 이어받기를 지원하지 않아 처음부터 다운로드합니다.")
+                offset = 0
+            elif offset:
+                print(f"{artifact.name}: {offset} byte 부터 이어받습니다.")
+
+            mode = 'ab' if offset else 'wb'
+            with open(part_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+    sha256 = _verify_part(artifact, part_path, total_size)
+    os.replace(part_path, artifact.path)
+    _write_meta(artifact.path, sha256)
+
+
+def ensure(artifact, offline=None):
+    """아티팩트가 로컬에 유효하게 존재하도록 보장하고 경로를 반환합니다."""
+    if offline is None:
+        offline = is_offline()
+
+    if (not offline and artifact.sha256 is None and os.path.exists(artifact.path)
+            and _read_meta(artifact.path) is None):
+        # 기대 해시가 없고 검증 기록도 없는 기존 파일 (이전 다운로더가 남긴 파일): 서버 크기와 비교
+        expected_size = remote_size(artifact.url)
+        if expected_size is not None and os.path.getsize(artifact.path) != expected_size:
+            print(f"{artifact.name} 크기가 원격 파일과 달라 다시 다운로드합니다.")
+            os.remove(artifact.path)
+
+    if verify(artifact):
+        print(f"{artifact.name} 파일이 이미 존재하여 다운로드를 생략합니다.")
+        return artifact.path
+
+    if offline:
+        raise ArtifactMissingError(f"오프라인 모드: {artifact.name} 아티팩트가 없거나 손상되었습니다 ({artifact.path})")
+
+    print(f"{artifact.name} 다운로드 시작...")
+    try:
+        _download(artifact)
+    except requests.RequestException as e:
+        raise ArtifactError(f"{artifact.name} 다운로드 중 오류 발생: {e}") from e
+    print(f"{artifact.name} 다운로드 완료!")
+    return artifact.path
+
+
+def ensure_all(artifacts, offline=None):
+    return [ensure(artifact, offline=offline) for artifact in artifacts]
@@ -0,0 +1,98 @@
+"""Micro-batching 스케줄러
+
+여러 요청 스레드가 submit(key, item) 으로 작업을 넣으면, 하나의 worker 스레드가 같은 key
+(예: (scale, step 수))를 가진 항목을 최대 max_batch_size 개 또는 첫 항목이 들어온 뒤
+max_wait 초까지 모아 run_batch(key, items) 를 한 번 호출하고, 결과를 각 Future 로 나눠 줍니다.
+key 가 다른 항목은 큐에 남아 다음 배치로 처리됩니다.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Pending:
+    __slots__ = ('key', 'item', 'future', 'enqueued_at')
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatchScheduler:
+    def __init__(self, run_batch, max_batch_size=4, max_wait=0.2, name='micro-batch'):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, key, item):
+        """항목을 큐에 넣고 결과를 받을 Future 를 반환합니다."""
+        pending = _Pending(key, item)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("scheduler is stopped")
+            self._pending.append(pending)
+            self._condition.notify_all()
+        return pending.future
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._stopped:
+                self._condition.wait()
+            if not self._pending:
+                return None
+
+            # 가장 오래 기다린 항목과 key 가 같은 항목을 모읍니다.
+            first = self._pending[0]
+            deadline = first.enqueued_at + self.max_wait
+            while True:
+                batch = [p for p in self._pending if p.key == first.key][:self.max_batch_size]
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch_size or remaining <= 0 or self._stopped:
+                    break
+                self._condition.wait(remaining)
+
+            selected = set(map(id, batch))
+            self._pending = [p for p in self._pending if id(p) not in selected]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            batch = [p for p in batch if p.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = list(self.run_batch(batch[0].key, [p.item for p in batch]))
+                if len(results) != len(batch):
+                    # zip 으로 잘라내면 남은 future 가 영원히 끝나지 않으므로 배치 전체를 실패시킵니다.
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items")
+            except BaseException as e:
+                for p in batch:
+                    p.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            print(f"Micro-batch: {len(batch)} items (key {batch[0].key}), "
+                  f"average batch size {self.items / self.batches:.2f}")
+            for p, result in zip(batch, results):
+                p.future.set_result(result)
+
+    def stop(self):
+        """남은 항목을 처리한 뒤 worker 를 종료합니다."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._worker.join()
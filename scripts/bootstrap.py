@@ -0,0 +1,136 @@
+"""의존성 설치 / 외부 저장소 클론 / 가중치 다운로드 전용 진입점
+
+서비스(higan-app.py, diffusion-app.py)는 시작할 때 이 작업을 하지 않으므로,
+배포 이미지 빌드나 최초 실행 전에 한 번 실행합니다.
+
+    python scripts/bootstrap.py higan
+    python scripts/bootstrap.py diffusion
+    python scripts/bootstrap.py all
+
+아티팩트는 artifact-digests.json 에 고정한 sha256 으로 검증합니다. 검증된 파일을 받은 환경에서
+`--pin-digests` 로 실행하면 아직 고정되지 않은 아티팩트의 sha256 을 이 파일에 기록합니다.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import artifact_store
+from artifact_store import Artifact
+from startup_timer import StartupTimer
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HIGAN_DIR = 'higan'
+HIGAN_REPO_URL = 'https://github.com/genforce/higan.git'
+HIGAN_REQUIREMENTS = os.path.join(SCRIPTS_DIR, 'higan-requirements.txt')
+HIGAN_PRETRAIN_SUBDIR = 'models/pretrain/pytorch'
+STYLEGAN_URL = 'https://www.dropbox.com/s/h1w7ld4hsvte5zf/stylegan_bedroom256_generator.pth?dl=1'
+STYLEGAN_FILENAME = 'stylegan_bedroom256_generator.pth'
+ORDER_W_URL = 'https://www.dropbox.com/s/hwjyclj749qtp89/order_w.npy?dl=1'
+ORDER_W_FILENAME = 'order_w_1k.npy'
+
+DIFFUSION_DIR = 'diffusion'
+DIFFUSION_REPO_URL = 'https://github.com/Fantasy-Studio/Paint-by-Example'
+DIFFUSION_REQUIREMENTS = os.path.join(SCRIPTS_DIR, 'diffusion-requirements.txt')
+DIFFUSION_CKPT_URL = 'https://huggingface.co/Fantasy-Studio/Paint-by-Example/resolve/main/model.ckpt'
+
+# 아티팩트 이름 -> 기대 sha256
+DIGESTS_PATH = os.path.join(SCRIPTS_DIR, 'artifact-digests.json')
+
+
+def known_digests(path=DIGESTS_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def pin_digests(artifacts, path=DIGESTS_PATH):
+    """받아 둔 아티팩트 중 아직 고정되지 않은 항목의 sha256 을 기록합니다."""
+    digests = known_digests(path)
+    for artifact in artifacts:
+        if artifact.sha256 is None:
+            digests[artifact.name] = artifact_store.recorded_sha256(artifact.path)
+            print(f"{artifact.name} sha256 고정: {digests[artifact.name]}")
+    with open(path, 'w') as f:
+        json.dump(digests, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def higan_artifacts(code_dir=HIGAN_DIR):
+    """HiGAN 에 필요한 가중치와 latent bank 목록"""
+    digests = known_digests()
+    return [
+        Artifact(STYLEGAN_FILENAME, STYLEGAN_URL, os.path.join(code_dir, HIGAN_PRETRAIN_SUBDIR, STYLEGAN_FILENAME),
+                 sha256=digests.get(STYLEGAN_FILENAME)),
+        Artifact(ORDER_W_FILENAME, ORDER_W_URL, os.path.join(code_dir, ORDER_W_FILENAME),
+                 sha256=digests.get(ORDER_W_FILENAME)),
+    ]
+
+
+def diffusion_artifacts(code_dir=DIFFUSION_DIR):
+    """Paint-by-Example 에 필요한 체크포인트 목록"""
+    return [
+        Artifact('model.ckpt', DIFFUSION_CKPT_URL, os.path.join(code_dir, 'checkpoints', 'model.ckpt'),
+                 sha256=known_digests().get('model.ckpt')),
+    ]
+
+
+def pip_install(requirements_path):
+    subprocess.run([sys.executable, '-m', 'pip', 'install', '-r', requirements_path], check=True)
+
+
+def git_clone(repo_url, code_dir):
+    if not os.path.exists(code_dir):
+        subprocess.run(['git', 'clone', repo_url, code_dir], check=True)
+
+
+def bootstrap_higan(timer, skip_pip=False, pin=False):
+    if not skip_pip:
+        with timer.phase('higan: pip install'):
+            pip_install(HIGAN_REQUIREMENTS)
+    with timer.phase('higan: git clone'):
+        git_clone(HIGAN_REPO_URL, HIGAN_DIR)
+    with timer.phase('higan: artifacts'):
+        artifact_store.ensure_all(higan_artifacts(HIGAN_DIR), offline=False)
+    if pin:
+        pin_digests(higan_artifacts(HIGAN_DIR))
+
+
+def bootstrap_diffusion(timer, skip_pip=False, pin=False):
+    if not skip_pip:
+        with timer.phase('diffusion: pip install'):
+            pip_install(DIFFUSION_REQUIREMENTS)
+    with timer.phase('diffusion: git clone'):
+        git_clone(DIFFUSION_REPO_URL, DIFFUSION_DIR)
+    with timer.phase('diffusion: artifacts'):
+        artifact_store.ensure_all(diffusion_artifacts(DIFFUSION_DIR), offline=False)
+    if pin:
+        pin_digests(diffusion_artifacts(DIFFUSION_DIR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="서비스 실행 전 의존성 및 모델 준비")
+    parser.add_argument('service', choices=['higan', 'diffusion', 'all'])
+    parser.add_argument('--skip-pip', action='store_true', help="pip install 을 생략합니다.")
+    parser.add_argument('--pin-digests', action='store_true',
+                        help="받은 아티팩트의 sha256 을 artifact-digests.json 에 고정합니다.")
+    args = parser.parse_args()
+
+    print(f"Current directory: {os.getcwd()}")
+    timer = StartupTimer('bootstrap')
+    if args.service in ('higan', 'all'):
+        bootstrap_higan(timer, skip_pip=args.skip_pip, pin=args.pin_digests)
+    if args.service in ('diffusion', 'all'):
+        bootstrap_diffusion(timer, skip_pip=args.skip_pip, pin=args.pin_digests)
+    print("모든 파일 다운로드 완료!")
+    timer.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""추천 결과 디버그 오버레이 (OpenCV)
+
+요청에 debug 플래그가 있을 때만 사용합니다. 생성 이미지 위에 heatmap, 추천 타원,
+최고점과 순위를 그려 하나의 작은 PNG 로 만듭니다.
+"""
+import numpy as np
+
+
+# Heatmap을 원본 이미지에 겹쳐서 시각화하는 함수
+def overlay_heatmap_on_image(image, grad_cam, alpha=0.5):
+    """RGB uint8 이미지 위에 heatmap 을 겹친 BGR uint8 이미지를 반환합니다."""
+    import cv2
+
+    grad_cam_resized = cv2.resize(grad_cam.astype(np.float32), (image.shape[1], image.shape[0]))
+    heatmap = cv2.applyColorMap(np.uint8(np.clip(grad_cam_resized, 0, 1) * 255), cv2.COLORMAP_JET)
+    image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    return cv2.addWeighted(heatmap, alpha, image_bgr, 1 - alpha, 0)
+
+
+def render_debug_overlay(image, heatmap, geometries):
+    """heatmap 오버레이에 추천 타원(빨강)과 최고점(라임), 순위를 표시합니다."""
+    import cv2
+
+    overlay = overlay_heatmap_on_image(image, heatmap)
+    scale_y = image.shape[0] / heatmap.shape[0]
+    scale_x = image.shape[1] / heatmap.shape[1]
+
+    for i, geometry in enumerate(geometries):
+        center_y, center_x = geometry["center"]
+        axes = (geometry["major_axis"] / 2 * scale_x, geometry["minor_axis"] / 2 * scale_y)
+        if np.all(np.isfinite(axes)):
+            cv2.ellipse(
+                overlay, (int(round(center_x * scale_x)), int(round(center_y * scale_y))),
+                (int(round(axes[0])), int(round(axes[1]))), geometry["angle"], 0, 360, (0, 0, 255), 2)
+
+        y, x = geometry["top_point"]
+        point = (int(round(x * scale_x)), int(round(y * scale_y)))
+        cv2.circle(overlay, point, 5, (0, 255, 0), -1)
+        cv2.circle(overlay, point, 5, (0, 0, 0), 1)
+        cv2.putText(overlay, f"Recommend {i + 1}", (point[0] + 5, point[1]),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1, cv2.LINE_AA)
+
+    return overlay
@@ -1,65 +1,28 @@
+from startup_timer import StartupTimer
+startup_timer = StartupTimer('diffusion-app')
+
 import os
-import subprocess
-import uuid
 import cv2
-import numpy as np
-import requests
-import boto3
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 from urllib.parse import urlparse
-from botocore.exceptions import NoCredentialsError, ClientError
-from skimage.metrics import structural_similarity as compare_ssim
+from botocore.exceptions import NoCredentialsError
 from pyngrok import ngrok
-from concurrent.futures import ThreadPoolExecutor
-
-# 초기 환경 설정
-current_dir = os.getcwd()
-print(f"Current directory: {current_dir}")
-
-os.system(f"pip install -r scripts/diffusion-requirements.txt")
-
-# diffusion 저장소 클론 및 파일 설정
-CODE_DIR = 'diffusion'
-if not os.path.exists(CODE_DIR):
-    os.system(f'git clone https://github.com/Fantasy-Studio/Paint-by-Example {CODE_DIR}')
-
-os.chdir(CODE_DIR)
-
-# 필요한 디렉토리 생성
-pretrain_dir = 'checkpoints'
-os.makedirs(pretrain_dir, exist_ok=True)
-
-def download_file_if_not_exists(url, save_name, target_dir):
-    save_path = os.path.join(target_dir, save_name)
-    
-    # 파일 존재 여부 확인
-    if os.path.exists(save_path):
-        # 파일이 있지만 용량이 0이거나 너무 작은 경우(다운로드 실패 흔적)를 대비해 체크하면 더 좋습니다.
-        if os.path.getsize(save_path) > 1000: # 최소 1KB 이상인지 확인
-            print(f"{save_name} 파일이 이미 존재하여 다운로드를 생략합니다.")
-            return
-        else:
-            print(f"기존 파일이 손상된 것으로 보여 다시 다운로드합니다.")
-
-    print(f"{save_name} 다운로드 시작...")
-    try:
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(save_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-        print(f"{save_name} 다운로드 완료!")
-    except Exception as e:
-        print(f"{save_name} 다운로드 중 오류 발생: {e}")
-
-model_url = "https://huggingface.co/Fantasy-Studio/Paint-by-Example/resolve/main/model.ckpt"
-download_file_if_not_exists(model_url, "model.ckpt", pretrain_dir)
-
-print("모든 파일 다운로드 완료!")
-
-os.chdir('..') 
+import artifact_store
+from bootstrap import DIFFUSION_DIR, diffusion_artifacts
+from batch_scheduler import MicroBatchScheduler
+from diffusion_engine import DDIM_STEPS, DiffusionEngine, to_uint8_image
+from dir_sync import move_outputs, prune_directory, sync_directory, task_scratch_dir
+from image_fetch import ImageFetcher
+from mask_engine import extract_mask
+from s3_uploader import S3Uploader
+from job_queue import QueueFull, create_job_queue
+from task_routes import queue_full_response, register_task_routes, submit_task
+from task_store import create_task_store
+startup_timer.mark('imports')
+
+# 의존성 설치, 저장소 클론, 체크포인트 다운로드는 bootstrap.py 에서 수행합니다.
 print(f"현재 위치: {os.getcwd()}")
 
 app = Flask(__name__)
@@ -72,6 +35,18 @@ aws_secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY')
 aws_s3_region = os.getenv('AWS_S3_REGION')
 bucket_name = os.getenv('AWS_S3_BUCKET_NAME')
 ngrok_token = os.getenv('NGROK_AUTH_TOKEN_diffusion')
+# 작업별 임시 폴더 위치와 lampX_results 에 결과를 남겨 둘 시간
+scratch_root = os.getenv('DIFFUSION_SCRATCH_DIR')
+results_max_age = float(os.getenv('DIFFUSION_RESULTS_MAX_AGE_HOURS', '24')) * 3600
+# micro-batching: 같은 scale/step 수의 요청을 최대 max_batch 개, 최대 max_wait 초까지 모아 한 번에 샘플링
+max_batch_size = int(os.getenv('DIFFUSION_MAX_BATCH', '4'))
+max_batch_wait = float(os.getenv('DIFFUSION_MAX_WAIT_MS', '200')) / 1000
+# quality="preview" 요청의 미리보기 step 수와 해상도 (64 의 배수, 전체 품질 512 보다 작게)
+preview_steps = int(os.getenv('DIFFUSION_PREVIEW_STEPS', '10'))
+preview_size = int(os.getenv('DIFFUSION_PREVIEW_SIZE', '256'))
+# /generate_mask: SSIM 계산 해상도 비율(1 = 전체 해상도)과 51x51 blur 의 축소 배율(1 = 정확한 GaussianBlur)
+mask_ssim_scale = float(os.getenv('DIFFUSION_MASK_SSIM_SCALE', '1.0'))
+mask_blur_factor = int(os.getenv('DIFFUSION_MASK_BLUR_FACTOR', '4'))
 
 # 환경 변수 로드 확인
 print(f"AWS S3 Region: {aws_s3_region}")
@@ -80,16 +55,34 @@ print(f"AWS Access Key ID 존재: {'있음' if aws_access_key_id else '없음'}"
 print(f"AWS Secret Access Key 존재: {'있음' if aws_secret_access_key else '없음'}")
 
 # --- 비동기 작업 관리 설정 ---
-executor = ThreadPoolExecutor(max_workers=2)
-tasks = {} # 작업 상태를 저장할 딕셔너리
+# worker 는 대부분 입력 fetch/업로드/배치 대기 중이므로 코어/메모리가 허락하면 배치 크기보다 넉넉하게 둡니다.
+# 대기 작업 수는 DIFFUSION_QUEUE_DEPTH 로 제한 (가득 차면 429 + Retry-After).
+job_queue = create_job_queue('DIFFUSION', memory_per_worker=512 * 1024 ** 2, max_workers=max(2, 2 * max_batch_size),
+                             min_workers=2, initial_service_time=30.0)
+# 작업 상태 저장소 (TTL/항목 수/byte 한도, DIFFUSION_TASK_STORE=sqlite 이면 여러 프로세스가 공유)
+tasks = create_task_store('DIFFUSION')
+
+# --- 상주 Paint-by-Example 엔진 (모델은 프로세스당 한 번만 로드) ---
+engine = DiffusionEngine(DIFFUSION_DIR)
+
+def run_diffusion_batch(key, items):
+    scale, ddim_steps, _ = key
+    return engine.generate_batch(items, scale=scale, ddim_steps=ddim_steps)
 
-# S3 클라이언트 초기화
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    region_name=aws_s3_region
-)
+def submit_diffusion(img, mask, reference, seed, scale, ddim_steps, size=512):
+    """같은 scale/step 수/크기의 요청과 하나의 샘플러 배치로 묶여 실행되도록 제출 (seed 는 항목별)"""
+    if size != img.shape[0]:
+        img, mask, reference = (cv2.resize(x, (size, size), interpolation=cv2.INTER_AREA) for x in (img, mask, reference))
+    return scheduler.submit((scale, ddim_steps, size), (img, mask, reference, seed))
+
+scheduler = MicroBatchScheduler(run_diffusion_batch, max_batch_size=max_batch_size, max_wait=max_batch_wait)
+
+# URL 이미지 fetcher (keep-alive 세션 + 디코딩된 512x512 배열 캐시, 조명 reference 이미지 재사용)
+image_fetcher = ImageFetcher(max_bytes=int(os.getenv('DIFFUSION_IMAGE_CACHE_BYTES', 256 * 1024 * 1024)))
+
+# S3 업로더 초기화 (client 와 업로드 스레드 풀을 모든 작업이 공유)
+uploader = S3Uploader(bucket_name, aws_s3_region)
+startup_timer.mark('config')
 
 def get_output_dir_from_image(reference_url, base_dir="."):
     """입력 이미지 파일명(lampX.png)에 맞는 lampX_results 폴더를 찾는 함수"""
@@ -118,155 +111,119 @@ def get_s3_key_prefix(image_url, reference_url):
 def upload_file_to_s3(local_path, s3_key, content_type="image/png"):
     """로컬 파일을 S3에 업로드하는 함수"""
     try:
-        s3_client.upload_file(
-            local_path, 
-            bucket_name, 
-            s3_key,
-            ExtraArgs={'ContentType': content_type}
-        )
-        return f"https://{bucket_name}.s3.{aws_s3_region}.amazonaws.com/{s3_key}"
+        return uploader.upload_file(local_path, s3_key, content_type)
     except NoCredentialsError:
         raise Exception("AWS 자격 증명이 없거나 잘못되었습니다.")
-    except ClientError as e:
-        raise Exception(f"S3 업로드 중 오류 발생: {str(e)}")
     except Exception as e:
         raise Exception(f"파일 업로드 실패: {str(e)}")
 
-def upload_directory_to_s3(local_dir, s3_prefix):
-    """디렉토리 전체를 S3에 업로드하는 함수"""
-    s3_urls = {}
-    
+def upload_directory_to_s3(local_dir, s3_prefix, files=None):
+    """디렉토리를 S3에 동기화하는 함수 (새로 생겼거나 바뀐 파일만 업로드, files 를 주면 그 파일만)"""
     try:
-        for root, dirs, files in os.walk(local_dir):
-            for file in files:
-                local_path = os.path.join(root, file)
-                
-                # 로컬 경로에서 상대 경로 추출
-                relative_path = os.path.relpath(local_path, start=local_dir)
-                
-                # 상대 경로가 None이나 빈 문자열이 아닌지 확인
-                if not relative_path:
-                    print(f"Warning: Empty relative path for {local_path}")
-                    continue
-                
-                # 윈도우 경로 구분자를 URL 경로 구분자로 변환
-                relative_path_fixed = relative_path.replace('\\', '/')
-                
-                # S3 키 생성
-                s3_key = f"{s3_prefix}{relative_path_fixed}"
-                
-                # 파일이 실제로 존재하는지 확인
-                if not os.path.exists(local_path):
-                    print(f"Warning: File does not exist: {local_path}")
-                    continue
-                
-                # 콘텐츠 타입 결정
-                content_type = "image/png" if file.endswith(".png") else "application/octet-stream"
-                
-                # S3에 업로드
-                try:
-                    s3_client.upload_file(
-                        local_path, 
-                        bucket_name, 
-                        s3_key,
-                        ExtraArgs={'ContentType': content_type}
-                    )
-                    s3_url = f"https://{bucket_name}.s3.{aws_s3_region}.amazonaws.com/{s3_key}"
-                    s3_urls[relative_path_fixed] = s3_url
-                    print(f"파일 업로드 완료: {local_path} -> {s3_url}")
-                except Exception as e:
-                    print(f"개별 파일 업로드 실패: {local_path} -> {str(e)}")
-                    continue
-                
-        return s3_urls
+        return sync_directory(uploader, local_dir, s3_prefix, files=files)
     except Exception as e:
         print(f"디렉토리 업로드 세부 오류: {str(e)}")
         raise Exception(f"디렉토리 업로드 실패: {str(e)}")
 
-def read_image_from_url(url, grayscale=False):
-    """Directly read image from URL without saving"""
+def read_image_from_url(url, grayscale=False, size=None):
+    """Directly read image from URL without saving (캐시된 배열은 읽기 전용)"""
     try:
-        # Read image from URL
-        response = requests.get(url)
-        response.raise_for_status()
-
-        # Convert to numpy array
-        image_array = np.asarray(bytearray(response.content), dtype=np.uint8)
-
-        # Decode image
-        if grayscale:
-            return cv2.imdecode(image_array, cv2.IMREAD_GRAYSCALE)
-        return cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+        return image_fetcher.fetch(url, grayscale=grayscale, size=size)
     except Exception as e:
         raise Exception(f"Failed to read image from {url}: {str(e)}")
 
-def resize_image(image, target_height=512, target_width=512):
-    return cv2.resize(image, (target_width, target_height))
+def read_images_from_urls(sources):
+    """[(url, grayscale)] 를 동시에 가져와 512x512 로 맞춘 배열 목록을 반환"""
+    try:
+        return image_fetcher.fetch_many([(url, grayscale, (512, 512)) for url, grayscale in sources])
+    except Exception as e:
+        raise Exception(f"Failed to read images: {str(e)}")
 
 # --- 백그라운드 작업 함수 (Worker) ---
 
 def background_process_image(task_id, data):
     """Diffusion 모델 처리 백그라운드 작업"""
     try:
-        tasks[task_id]['status'] = 'processing'
+        tasks.update(task_id, {'status': 'processing', 'stage': 'fetching'})
         image_url = data.get("image_path")
         mask_url = data.get("mask_path")
         reference_url = data.get("reference_path")
-        seed = data.get("seed", 321)
-        scale = data.get("scale", 20)
+        seed = int(data.get("seed", 321))
+        scale = float(data.get("scale", 20))
+        ddim_steps = int(data.get("steps", DDIM_STEPS))
+        # quality="preview": 적은 step(선택적으로 낮은 해상도)의 미리보기를 먼저 status 'preview' 로 반환
+        preview = data.get("quality") == "preview"
 
         output_dir = get_output_dir_from_image(reference_url)
-        img = read_image_from_url(image_url)
-        mask = read_image_from_url(mask_url, grayscale=True)
-        reference = read_image_from_url(reference_url)
-
-        if img.shape[:2] != (512, 512): img = resize_image(img)
-        if mask.shape[:2] != (512, 512): mask = resize_image(mask)
-        if reference.shape[:2] != (512, 512): reference = resize_image(reference)
+        # 세 입력을 동시에 가져옴 (512x512 로 맞춘 배열, reference 조명 이미지는 캐시에서 재사용)
+        img, mask, reference = read_images_from_urls([(image_url, False), (mask_url, True), (reference_url, False)])
 
         base_name = os.path.splitext(os.path.basename(urlparse(image_url).path))[0] or "image"
-        temp_paths = {
-            "image": os.path.join(output_dir, f"{base_name}_temp.png"),
-            "mask": os.path.join(output_dir, f"{base_name}_mask_temp.png"),
-            "reference": os.path.join(output_dir, f"{base_name}_reference_temp.png")
-        }
-        for path, img_data in zip(temp_paths.values(), [img, mask, reference]):
-            cv2.imwrite(path, img_data)
-
-        command = ["python", "diffusion/scripts/inference.py", "--plms", "--outdir", output_dir,
-                   "--config", "diffusion/configs/v1.yaml", "--ckpt", "diffusion/checkpoints/model.ckpt",
-                   "--image_path", temp_paths['image'], "--mask_path", temp_paths['mask'],
-                   "--reference_path", temp_paths['reference'], "--seed", str(seed), "--scale", str(scale)]
-        
-        result = subprocess.run(command, capture_output=True, text=True)
-        if result.returncode != 0: raise Exception(result.stderr)
-
-        processed_file_path = os.path.join(output_dir, "results", f"{base_name}_temp_{seed}.png")
-        for p in temp_paths.values(): 
-            if os.path.exists(p): os.remove(p)
 
         filename = image_url.split('-')[-1]
         s3_prefix = get_s3_key_prefix(filename, reference_url)
-        s3_urls = upload_directory_to_s3(output_dir, s3_prefix)
-        
+
+        tasks.update(task_id, {'stage': 'sampling'})
+        # 디코딩된 배열을 상주 모델에 바로 전달 (임시 입력 PNG, subprocess 없음)
+        # 미리보기와 전체 품질 작업을 함께 제출하면 미리보기 배치가 먼저 실행됨
+        preview_future = None
+        if preview:
+            size = max(64, int(data.get("preview_size", preview_size)) // 64 * 64)
+            steps = int(data.get("preview_steps", preview_steps))
+            preview_future = submit_diffusion(img, mask, reference, seed, scale, steps, size)
+        full_future = submit_diffusion(img, mask, reference, seed, scale, ddim_steps)
+
+        if preview_future is not None:
+            # 미리보기 실패는 전체 품질 결과에 영향을 주지 않음
+            try:
+                _, png = cv2.imencode('.png', to_uint8_image(preview_future.result()))
+                preview_key = f"{s3_prefix}results/{base_name}_temp_{seed}_preview.png"
+                preview_url = uploader.upload_bytes(preview_key, png.tobytes())
+                tasks.update(task_id, {
+                    'status': 'preview',
+                    'result': {"quality": "preview", "s3_processed_image_path": preview_url}
+                })
+            except Exception as e:
+                print(f"미리보기 생성 실패: {e}")
+
+        result = full_future.result()
+        tasks.update(task_id, {'stage': 'uploading'})
+
+        # 결과는 작업별 임시 폴더에 쓴 뒤 lampX_results 로 옮김 (/generate_mask 가 결과 파일을 다시 읽음)
+        with task_scratch_dir(task_id, scratch_root) as scratch_dir:
+            os.makedirs(os.path.join(scratch_dir, "results"))
+            cv2.imwrite(os.path.join(scratch_dir, "results", f"{base_name}_temp_{seed}.png"), to_uint8_image(result))
+            produced_files = move_outputs(scratch_dir, output_dir)
+
+        processed_file_path = os.path.join(output_dir, "results", f"{base_name}_temp_{seed}.png")
+
+        sync_report = upload_directory_to_s3(output_dir, s3_prefix, files=produced_files)
+        s3_urls = sync_report["s3_urls"]
+
+        # 오래된 결과 파일 정리 (이미 S3 에 업로드됨)
+        prune_directory(output_dir, results_max_age)
+
         rel_path = os.path.relpath(processed_file_path, start=output_dir).replace('\\', '/')
-        s3_processed_image_path = f"https://{bucket_name}.s3.{aws_s3_region}.amazonaws.com/{s3_prefix}{rel_path}"
+        s3_processed_image_path = uploader.url_for(f"{s3_prefix}{rel_path}")
 
-        tasks[task_id].update({
+        tasks.update(task_id, {
             'status': 'completed',
             'result': {
+                "quality": "full",
                 "processed_image_path": processed_file_path,
                 "s3_processed_image_path": s3_processed_image_path,
-                "s3_urls": s3_urls
+                "s3_urls": s3_urls,
+                "bytes_uploaded": sync_report["bytes_uploaded"],
+                "bytes_skipped": sync_report["bytes_skipped"]
             }
         })
     except Exception as e:
-        tasks[task_id].update({'status': 'failed', 'error': str(e)})
+        tasks.update(task_id, {'status': 'failed', 'error': str(e)})
 
 def background_generate_mask(task_id, data):
     """마스크 생성 백그라운드 작업"""
     try:
-        tasks[task_id]['status'] = 'processing'
+        tasks.update(task_id, {'status': 'processing', 'stage': 'fetching'})
         processed_image_path = os.path.abspath(data.get("processed_image_path"))
         original_image_path = data.get("original_image_path")
         reference_url = data.get("reference_path")
@@ -274,24 +231,11 @@ def background_generate_mask(task_id, data):
 
         output_dir = get_output_dir_from_image(reference_url)
         imageA = cv2.imread(processed_image_path)
-        imageB = read_image_from_url(original_image_path)
-
-        if imageA.shape[:2] != imageB.shape[:2]:
-            imageB = cv2.resize(imageB, (imageA.shape[1], imageA.shape[0]))
-
-        grayA, grayB = cv2.cvtColor(imageA, cv2.COLOR_BGR2GRAY), cv2.cvtColor(imageB, cv2.COLOR_BGR2GRAY)
-        (score, diff) = compare_ssim(grayA, grayB, full=True)
-        diff = (diff * 255).astype("uint8")
-        _, thresh = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
-        
-        flood_filled = thresh.copy()
-        h, w = flood_filled.shape[:2]
-        cv2.floodFill(flood_filled, np.zeros((h + 2, w + 2), dtype=np.uint8), (0, 0), 255)
-        combined_filled = cv2.bitwise_or(thresh, cv2.bitwise_not(flood_filled))
-        
-        _, bright_mask = cv2.threshold(grayA, 200, 255, cv2.THRESH_BINARY)
-        common_mask = cv2.bitwise_and(combined_filled, bright_mask)
-        blurred_mask = cv2.GaussianBlur(common_mask, (51, 51), 0)
+        # /process_image 가 같은 크기로 가져온 원본 배열을 fetcher 캐시에서 재사용
+        imageB = read_image_from_url(original_image_path, size=imageA.shape[:2])
+
+        tasks.update(task_id, {'stage': 'masking'})
+        blurred_mask = extract_mask(imageA, imageB, scale=mask_ssim_scale, blur_factor=mask_blur_factor)
 
         base_name = os.path.splitext(os.path.basename(urlparse(processed_image_path).path))[0]
         mask_path = os.path.join(output_dir, f"mask_{base_name}.png")
@@ -305,40 +249,46 @@ def background_generate_mask(task_id, data):
         s3_key = f"{s3_prefix}{relative_path_fixed}"
         s3_mask_url = upload_file_to_s3(mask_path, s3_key)
 
-        tasks[task_id].update({
+        tasks.update(task_id, {
             'status': 'completed',
             'result': {"mask_path": mask_path, "s3_mask_url": s3_mask_url}
         })
     except Exception as e:
-        tasks[task_id].update({'status': 'failed', 'error': str(e)})
+        tasks.update(task_id, {'status': 'failed', 'error': str(e)})
 
 # --- API 엔드포인트 ---
 
 @app.route("/process_image", methods=["POST"])
 def process_image():
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {'status': 'queued'}
-    executor.submit(background_process_image, task_id, request.json)
+    try:
+        task_id = submit_task(tasks, job_queue, background_process_image, request.json)
+    except QueueFull as e:
+        return queue_full_response(e)
     return jsonify({"message": "Processing started", "task_id": task_id}), 202
 
 @app.route("/generate_mask", methods=["POST"])
 def generate_mask():
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {'status': 'queued'}
-    executor.submit(background_generate_mask, task_id, request.json)
+    try:
+        task_id = submit_task(tasks, job_queue, background_generate_mask, request.json)
+    except QueueFull as e:
+        return queue_full_response(e)
     return jsonify({"message": "Mask generation started", "task_id": task_id}), 202
 
-@app.route("/task_status/<task_id>", methods=["GET"])
-def get_task_status(task_id):
-    task = tasks.get(task_id)
-    if not task: return jsonify({"error": "Task not found"}), 404
-    return jsonify(task), 200
+# /task_status/<task_id> (?wait=&since= long-poll), /task_events/<task_id> (SSE)
+register_task_routes(app, tasks, job_queue)
 
 # 로컬에서 실행할 때
 # if __name__ == "__main__":
 #     app.run(host="0.0.0.0", port=8080, debug=True)
 
 if __name__ == '__main__':
+    # 체크포인트 확인만 수행 (없으면 다운로드하지 않고 즉시 실패)
+    with startup_timer.phase('artifacts'):
+        artifact_store.ensure_all(diffusion_artifacts(DIFFUSION_DIR), offline=True)
+
+    # 모델을 미리 로드
+    engine.load(timer=startup_timer)
+
     # ngrok 인증 및 터널 생성
     PORT = 8080
     if ngrok_token:
@@ -356,6 +306,8 @@ if __name__ == '__main__':
             print(f"ngrok 연결 실패: {e}")
     else:
         print("경고: NGROK_AUTH_TOKEN이 설정되지 않았습니다. 로컬에서만 접속 가능합니다.")
+    startup_timer.mark('ngrok')
+    startup_timer.report()
 
     # Flask 실행 (debug=True 사용 시 use_reloader=False 권장)
     # use_reloader=False를 안 하면 ngrok 터널이 두 번 실행되려다 에러가 날 수 있습니다.
@@ -0,0 +1,184 @@
+"""Paint-by-Example 상주 추론 엔진
+
+기존에는 요청마다 입력 PNG 3장을 디스크에 쓰고 `diffusion/scripts/inference.py` 를 subprocess 로
+실행해 model.ckpt, config, CLIP encoder 를 매번 다시 로드했습니다. 이 엔진은 LatentDiffusion 모델을
+`DiffusionEngine.load()` 에서 한 번만 올려 두고, 디코딩된 img / mask / reference 배열을 받아
+결과 tensor 를 바로 반환합니다. 전처리와 샘플링은 inference.py 와 같은 순서로 수행합니다.
+"""
+import os
+import sys
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+from bootstrap import DIFFUSION_DIR
+from startup_timer import StartupTimer
+
+CONFIG_PATH = 'configs/v1.yaml'
+CKPT_PATH = 'checkpoints/model.ckpt'
+IMAGE_SIZE = 512  # H, W
+LATENT_CHANNELS = 4  # C
+DOWNSAMPLE_FACTOR = 8  # f
+REFERENCE_SIZE = 224  # CLIP 입력 크기
+DDIM_STEPS = 50
+DDIM_ETA = 0.0
+
+
+def get_tensor(normalize=True, to_tensor=True):
+    import torchvision
+
+    transform_list = []
+    if to_tensor:
+        transform_list += [torchvision.transforms.ToTensor()]
+    if normalize:
+        transform_list += [torchvision.transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))]
+    return torchvision.transforms.Compose(transform_list)
+
+
+def get_tensor_clip(normalize=True, to_tensor=True):
+    import torchvision
+
+    transform_list = []
+    if to_tensor:
+        transform_list += [torchvision.transforms.ToTensor()]
+    if normalize:
+        transform_list += [torchvision.transforms.Normalize((0.48145466, 0.4578275, 0.40821073),
+                                                           (0.26862954, 0.26130258, 0.27577711))]
+    return torchvision.transforms.Compose(transform_list)
+
+
+def to_uint8_image(sample):
+    """[3, H, W] [0, 1] 결과 tensor 를 OpenCV 로 저장할 수 있는 BGR uint8 배열로 변환합니다."""
+    image = (255. * sample.cpu().permute(1, 2, 0).numpy()).astype(np.uint8)
+    return np.ascontiguousarray(image[:, :, ::-1])
+
+
+class DiffusionEngine:
+    """LatentDiffusion 모델을 한 번 로드해 두고 요청마다 샘플링만 실행하는 엔진"""
+
+    def __init__(self, code_dir=DIFFUSION_DIR, config_path=CONFIG_PATH, ckpt_path=CKPT_PATH, device=None, plms=True):
+        self.code_dir = os.path.abspath(code_dir)
+        self.config_path = os.path.join(self.code_dir, config_path)
+        self.ckpt_path = os.path.join(self.code_dir, ckpt_path)
+        self.device = device
+        self.plms = plms
+        self.loaded = False
+        # 하나의 모델/샘플러를 공유하므로 동시에 하나의 요청만 샘플링합니다.
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self, timer=None):
+        """config, model.ckpt, CLIP encoder 를 한 번만 로드합니다."""
+        timer = timer or StartupTimer('diffusion-engine')
+        with self._load_lock:
+            if self.loaded:
+                return self
+
+            with timer.phase('import torch'):
+                import torch
+
+            if self.code_dir not in sys.path:
+                sys.path.append(self.code_dir)
+
+            with timer.phase('import ldm'):
+                from ldm.models.diffusion.ddim import DDIMSampler
+                from ldm.models.diffusion.plms import PLMSSampler
+                from ldm.util import instantiate_from_config
+                from omegaconf import OmegaConf
+
+            if self.device is None:
+                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            print(f"Using device: {self.device}")
+
+            with timer.phase('model.ckpt'):
+                config = OmegaConf.load(self.config_path)
+                state_dict = torch.load(self.ckpt_path, map_location="cpu")["state_dict"]
+                model = instantiate_from_config(config.model)
+                model.load_state_dict(state_dict, strict=False)
+                del state_dict
+                self.model = model.to(self.device).eval()
+
+            self.sampler = PLMSSampler(self.model) if self.plms else DDIMSampler(self.model)
+            self.loaded = True
+        return self
+
+    def _prepare(self, image, mask, reference):
+        """inference.py 와 같은 전처리 (PIL RGB 기준). (image, reference, mask) tensor 를 반환합니다."""
+        import cv2
+        import torch
+        from PIL import Image
+
+        image_tensor = get_tensor()(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))).unsqueeze(0)
+        reference_image = Image.fromarray(cv2.cvtColor(reference, cv2.COLOR_BGR2RGB))
+        reference_image = reference_image.resize((REFERENCE_SIZE, REFERENCE_SIZE), Image.BICUBIC)
+        reference_tensor = get_tensor_clip()(reference_image).unsqueeze(0)
+
+        mask = 1 - mask.astype(np.float32)[None, None] / 255.0
+        mask[mask < 0.5] = 0
+        mask[mask >= 0.5] = 1
+        return image_tensor, reference_tensor, torch.from_numpy(mask)
+
+    def generate(self, image, mask, reference, seed=321, scale=20, ddim_steps=DDIM_STEPS):
+        """img(BGR), mask(grayscale, 흰색이 합성할 영역), reference(BGR) uint8 배열로 합성 결과를 만듭니다.
+
+        입력 크기(기본 512x512, 64 의 배수)가 결과 크기가 됩니다. 결과는 [3, H, W] [0, 1] float tensor (CPU) 입니다.
+        """
+        return self.generate_batch([(image, mask, reference, seed)], scale=scale, ddim_steps=ddim_steps)[0]
+
+    def generate_batch(self, items, scale=20, ddim_steps=DDIM_STEPS):
+        """[(img, mask, reference, seed)] 를 하나의 샘플러 배치로 합성합니다 (scale, step 수, 이미지 크기는 공통).
+
+        항목마다 seed 를 고정한 뒤 first stage encoding 과 초기 noise(x_T)를 만들므로,
+        각 결과는 그 항목을 generate() 로 따로 실행했을 때와 같은 noise 를 사용합니다.
+        """
+        import torch
+        from pytorch_lightning import seed_everything
+        from torchvision.transforms import Resize
+
+        self.load()
+        device = self.device
+        prepared = [self._prepare(image, mask, reference) for image, mask, reference, _ in items]
+        height, width = prepared[0][0].shape[-2:]
+        shape = [LATENT_CHANNELS, height // DOWNSAMPLE_FACTOR, width // DOWNSAMPLE_FACTOR]
+
+        is_cuda = device.type == 'cuda'
+        precision_scope = torch.autocast("cuda") if is_cuda else nullcontext()
+        with self._lock, torch.no_grad(), precision_scope, self.model.ema_scope():
+            conditionings, inpaint_images, inpaint_masks, start_codes = [], [], [], []
+            for (image_tensor, reference_tensor, mask_tensor), (*_, seed) in zip(prepared, items):
+                # 항목별 seed 고정 (같은 입력/seed 는 같은 결과)
+                seed_everything(int(seed))
+
+                reference_tensor = reference_tensor.to(device)
+                c = self.model.get_learned_conditioning(reference_tensor.half() if is_cuda else reference_tensor)
+                conditionings.append(self.model.proj_out(c))
+
+                z_inpaint = self.model.get_first_stage_encoding(
+                    self.model.encode_first_stage((image_tensor * mask_tensor).to(device))).detach()
+                inpaint_images.append(z_inpaint)
+                inpaint_masks.append(Resize([z_inpaint.shape[-2], z_inpaint.shape[-1]])(mask_tensor.to(device)))
+                start_codes.append(torch.randn([1] + shape, device=device))
+
+            batch_size = len(items)
+            uc = self.model.learnable_vector.repeat(batch_size, 1, 1) if scale != 1.0 else None
+            samples, _ = self.sampler.sample(
+                S=ddim_steps,
+                conditioning=torch.cat(conditionings),
+                batch_size=batch_size,
+                shape=shape,
+                verbose=False,
+                unconditional_guidance_scale=scale,
+                unconditional_conditioning=uc,
+                eta=DDIM_ETA,
+                x_T=torch.cat(start_codes),
+                test_model_kwargs={
+                    'inpaint_image': torch.cat(inpaint_images),
+                    'inpaint_mask': torch.cat(inpaint_masks),
+                }
+            )
+
+            x_samples = self.model.decode_first_stage(samples)
+            x_samples = torch.clamp((x_samples + 1.0) / 2.0, min=0.0, max=1.0)
+
+        return list(x_samples.float().cpu())
@@ -0,0 +1,164 @@
+"""결과 디렉토리 → S3 증분 동기화와 작업별 임시 디렉토리
+
+lampX_results 폴더에는 과거 요청의 결과가 계속 쌓이므로 매번 폴더 전체를 업로드하면
+업로드 시간이 끝없이 늘어납니다. 폴더마다 `.s3-sync-manifest.json` 에 S3 key 별로
+(size, mtime_ns, sha256) 를 기록해 두고, 새로 생겼거나 내용이 바뀐 파일만 업로드합니다.
+
+- size/mtime 이 기록과 같으면 해시 없이 건너뜁니다.
+- 다르면 해시를 계산해 내용이 같으면 기록만 갱신하고 건너뜁니다.
+"""
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from artifact_store import file_sha256
+
+MANIFEST_FILENAME = '.s3-sync-manifest.json'
+
+_manifest_locks = {}
+_manifest_locks_guard = threading.Lock()
+
+
+def _manifest_lock(local_dir):
+    with _manifest_locks_guard:
+        return _manifest_locks.setdefault(os.path.abspath(local_dir), threading.Lock())
+
+
+def load_manifest(local_dir):
+    try:
+        with open(os.path.join(local_dir, MANIFEST_FILENAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(local_dir, manifest):
+    path = os.path.join(local_dir, MANIFEST_FILENAME)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _content_type(path):
+    return "image/png" if path.endswith(".png") else "application/octet-stream"
+
+
+def _walk(local_dir):
+    for root, _, files in os.walk(local_dir):
+        for file in files:
+            if file == MANIFEST_FILENAME or file.endswith('.tmp'):
+                continue
+            yield os.path.join(root, file)
+
+
+def _targets(local_dir, files):
+    """files 중 local_dir 안에 있는 동기화 대상 파일만 골라냅니다 (폴더 전체를 나열하지 않음)."""
+    root = os.path.abspath(local_dir)
+    for path in dict.fromkeys(os.path.abspath(path) for path in files):
+        name = os.path.basename(path)
+        if name == MANIFEST_FILENAME or name.endswith('.tmp') or not os.path.isfile(path):
+            continue
+        if os.path.commonpath([root, path]) != root:
+            continue
+        yield path
+
+
+def sync_directory(uploader, local_dir, s3_prefix, files=None):
+    """local_dir 의 새 파일/변경된 파일만 `s3_prefix + 상대 경로` 로 업로드합니다.
+
+    업로드는 uploader(S3Uploader)의 thread pool 로 동시에 진행합니다.
+    files 를 주면 폴더를 나열하지 않고 그 파일들(이번 작업이 만든 파일)만 확인하므로,
+    쌓인 과거 결과 수와 관계없이 이번 작업의 파일 수만큼만 비용이 듭니다.
+    반환값: {"s3_urls": {상대 경로: url}, "uploaded", "skipped", "bytes_uploaded", "bytes_skipped", "seconds"}
+    """
+    from s3_uploader import UploadJob
+
+    report = {"s3_urls": {}, "uploaded": 0, "skipped": 0, "bytes_uploaded": 0, "bytes_skipped": 0}
+
+    with _manifest_lock(local_dir):
+        manifest = load_manifest(local_dir)
+        pending = []
+        for local_path in (_walk(local_dir) if files is None else _targets(local_dir, files)):
+            size = os.path.getsize(local_path)
+            # 윈도우 경로 구분자를 URL 경로 구분자로 변환
+            relative_path = os.path.relpath(local_path, start=local_dir).replace('\\', '/')
+            s3_key = f"{s3_prefix}{relative_path}"
+            mtime_ns = os.stat(local_path).st_mtime_ns
+            recorded = manifest.get(s3_key)
+
+            if recorded and recorded["size"] == size and recorded["mtime_ns"] == mtime_ns:
+                sha256 = recorded["sha256"]
+            else:
+                sha256 = file_sha256(local_path)
+            entry = {"size": size, "mtime_ns": mtime_ns, "sha256": sha256}
+
+            if recorded and recorded["sha256"] == sha256:
+                # 이미 업로드된 내용과 같음
+                manifest[s3_key] = entry
+                report["skipped"] += 1
+                report["bytes_skipped"] += size
+                report["s3_urls"][relative_path] = uploader.url_for(s3_key)
+            else:
+                pending.append((UploadJob(s3_key, path=local_path, content_type=_content_type(local_path)),
+                                relative_path, entry))
+
+        # 실패한 파일은 기록하지 않으므로 다음 동기화에서 다시 시도합니다.
+        upload_report = uploader.upload_many([job for job, _, _ in pending])
+        for job, relative_path, entry in pending:
+            if job.key in upload_report["urls"]:
+                manifest[job.key] = entry
+                report["uploaded"] += 1
+                report["bytes_uploaded"] += entry["size"]
+                report["s3_urls"][relative_path] = upload_report["urls"][job.key]
+        report["seconds"] = upload_report["seconds"]
+
+        save_manifest(local_dir, manifest)
+
+    print(f"동기화 완료: {report['uploaded']}개 업로드 ({report['bytes_uploaded']} bytes), "
+          f"{report['skipped']}개 건너뜀 ({report['bytes_skipped']} bytes)")
+    return report
+
+
+def prune_directory(local_dir, max_age_seconds):
+    """max_age_seconds 보다 오래된 결과 파일을 지워 디스크 사용량을 제한합니다.
+
+    결과는 작업이 끝날 때 업로드되므로 오래된 파일은 S3 에만 남습니다. manifest 기록은 유지합니다.
+    """
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    with _manifest_lock(local_dir):
+        for local_path in _walk(local_dir):
+            if os.path.getmtime(local_path) < cutoff:
+                os.remove(local_path)
+                removed += 1
+    return removed
+
+
+@contextlib.contextmanager
+def task_scratch_dir(task_id, root=None):
+    """작업 하나가 쓰는 임시 디렉토리를 만들고, 작업이 끝나면(실패해도) 지웁니다."""
+    root = root or os.path.join(tempfile.gettempdir(), 'diffusion-scratch')
+    os.makedirs(root, exist_ok=True)
+    path = tempfile.mkdtemp(prefix=f"{task_id}-", dir=root)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def move_outputs(scratch_dir, output_dir):
+    """scratch_dir 의 파일을 같은 상대 경로로 output_dir 로 옮기고, 옮긴 경로 목록을 반환합니다."""
+    moved = []
+    for local_path in _walk(scratch_dir):
+        relative_path = os.path.relpath(local_path, start=scratch_dir)
+        target = os.path.join(output_dir, relative_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(local_path, target)
+        moved.append(target)
+    return moved
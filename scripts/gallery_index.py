@@ -0,0 +1,129 @@
+"""미리 계산한 갤러리 추천 결과 인덱스 (sqlite 파일 하나)
+
+이미지 이름은 `num_sample_noise_seed_image_num` 이므로 서비스할 수 있는 방의 목록을 미리 알 수 있습니다.
+precompute-gallery.py 가 이 목록에 대해 aggregate heatmap, 클러스터 중심, 마스크 PNG 를 계산해
+이 파일에 기록하고, API 는 (version, num_sample, noise_seed, image_num) 로 바로 조회합니다.
+
+- heatmap: float16 배열 bytes (height, width 컬럼과 함께 저장)
+- clusters: [{"cluster_center": {"y", "x"}, "cluster_id"}] JSON
+- masks: 클러스터 순서대로 PNG bytes
+"""
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    version TEXT NOT NULL,
+    num_sample INTEGER NOT NULL,
+    noise_seed INTEGER NOT NULL,
+    image_num INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    heatmap BLOB NOT NULL,
+    clusters TEXT NOT NULL,
+    PRIMARY KEY (version, num_sample, noise_seed, image_num)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS masks (
+    version TEXT NOT NULL,
+    num_sample INTEGER NOT NULL,
+    noise_seed INTEGER NOT NULL,
+    image_num INTEGER NOT NULL,
+    mask_index INTEGER NOT NULL,
+    png BLOB NOT NULL,
+    PRIMARY KEY (version, num_sample, noise_seed, image_num, mask_index)
+) WITHOUT ROWID;
+"""
+
+
+def read_manifest(path):
+    """manifest 파일에서 (num_sample, noise_seed, image_num) 목록을 읽습니다.
+
+    한 줄에 하나씩 `num_sample,noise_seed,image_num` 또는 이미지 이름을 적습니다.
+    `num_sample,noise_seed` 처럼 두 값만 있으면 image_num 0 ~ num_sample-1 을 모두 포함합니다.
+    빈 줄과 `#` 으로 시작하는 줄은 무시합니다.
+    """
+    import re
+
+    triples = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            numbers = list(map(int, re.findall(r'\d+', line)))
+            if len(numbers) == 2:
+                triples.extend((numbers[0], numbers[1], image_num) for image_num in range(numbers[0]))
+            elif len(numbers) == 3:
+                if not 0 <= numbers[2] < numbers[0]:
+                    raise ValueError(f"{path}:{line_number}: image_num is out of bounds for num_sample: {line}")
+                triples.append(tuple(numbers))
+            else:
+                raise ValueError(f"{path}:{line_number}: expected 2 or 3 numbers: {line}")
+    return list(dict.fromkeys(triples))
+
+
+class GalleryIndex:
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        if readonly:
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, version, num_sample, noise_seed, image_num, with_heatmap=False):
+        """저장된 결과를 반환합니다. 없으면 None 입니다.
+
+        반환값: {"mask_images": clusters, "masks": {filename: png}, ("heatmap": [H, W] float32)}
+        """
+        key = (version, num_sample, noise_seed, image_num)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT height, width, heatmap, clusters FROM results "
+                "WHERE version = ? AND num_sample = ? AND noise_seed = ? AND image_num = ?", key).fetchone()
+            if row is None:
+                return None
+            masks = self.connection.execute(
+                "SELECT mask_index, png FROM masks "
+                "WHERE version = ? AND num_sample = ? AND noise_seed = ? AND image_num = ? ORDER BY mask_index",
+                key).fetchall()
+
+        height, width, heatmap, clusters = row
+        entry = {
+            "mask_images": json.loads(clusters),
+            "masks": {f"mask_cluster_{mask_index + 1}.png": png for mask_index, png in masks},
+        }
+        if with_heatmap:
+            entry["heatmap"] = np.frombuffer(heatmap, dtype=np.float16).reshape(height, width).astype(np.float32)
+        return entry
+
+    def contains(self, version, triples):
+        """triples 중 이미 저장된 항목의 집합을 반환합니다."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT num_sample, noise_seed, image_num FROM results WHERE version = ?", (version,)).fetchall()
+        stored = set(rows)
+        return {tuple(triple) for triple in triples if tuple(triple) in stored}
+
+    def put_many(self, version, entries):
+        """[(triple, heatmap, clusters, pngs)] 를 한 트랜잭션으로 기록합니다."""
+        with self._lock, self.connection:
+            for (num_sample, noise_seed, image_num), heatmap, clusters, pngs in entries:
+                key = (version, num_sample, noise_seed, image_num)
+                heatmap = np.ascontiguousarray(heatmap, dtype=np.float16)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + (heatmap.shape[0], heatmap.shape[1], heatmap.tobytes(), json.dumps(clusters)))
+                self.connection.execute(
+                    "DELETE FROM masks WHERE version = ? AND num_sample = ? AND noise_seed = ? AND image_num = ?", key)
+                self.connection.executemany(
+                    "INSERT INTO masks VALUES (?, ?, ?, ?, ?, ?)",
+                    [key + (mask_index, png) for mask_index, png in enumerate(pngs)])
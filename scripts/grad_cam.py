@@ -0,0 +1,380 @@
+"""ΔGrad-CAM 계산 엔진
+
+기존에는 레이어(6~11)와 latent code(조작 전/후)마다 synthesis 를 한 번씩 실행해
+forward/backward 를 12번씩 반복했습니다. 이 엔진은
+
+- 모든 대상 레이어에 forward hook 을 한 번에 등록하고,
+- negative/positive code 를 하나의 배치로 묶어 한 번의 forward 로 feature map 을 모으고,
+- 마지막 대상 레이어 이후의 synthesis 는 건너뛴 뒤,
+- 레이어별 score 를 feature map 에서 직접 계산해 한 번의 backward 로 모든 gradient 를 얻고,
+- Grad-CAM 가중합과 정규화, resize 를 배치 단위 tensor 연산으로 device 위에서 처리합니다.
+
+score_k 는 레이어 k 의 출력에만 의존하므로, 각 레이어 출력을 leaf 로 떼어 낸 뒤 미분하면
+기존 backward hook 이 받던 gradient(d score_k / d feature_map_k)와 같은 값이 나옵니다.
+"""
+import numpy as np
+
+
+class _StopForward(Exception):
+    """마지막 대상 레이어까지 feature map 을 모은 뒤 synthesis 를 중단하기 위한 예외"""
+
+
+# Grad-CAM 계산 함수 (기존 channel 루프 구현, 벤치마크/비교용)
+def calculate_grad_cam(feature_map, gradients):
+    import torch
+
+    pooled_gradients = torch.mean(gradients, dim=[0, 2, 3])  # [C]
+    grad_cam = torch.zeros_like(feature_map[0, 0])
+    for i in range(feature_map.shape[1]):
+        grad_cam += pooled_gradients[i] * feature_map[0, i]
+    grad_cam = torch.relu(grad_cam)  # ReLU 적용
+    grad_cam -= grad_cam.min()  # 정규화
+    grad_cam /= grad_cam.max()
+    return grad_cam.detach().cpu().numpy()
+
+
+def _normalize_per_sample(maps, eps=1e-12):
+    """[N, H, W] 를 샘플별로 (x - min) / (max - min) 정규화합니다. 범위가 0 이면 0 을 반환합니다."""
+    import torch
+
+    flat = maps.flatten(1)
+    minimum = flat.min(dim=1).values[:, None, None]
+    value_range = flat.max(dim=1).values[:, None, None] - minimum
+    shifted = maps - minimum
+    return torch.where(value_range > eps, shifted / value_range.clamp_min(eps), torch.zeros_like(shifted))
+
+
+def batched_grad_cam(feature_maps, gradients):
+    """[N, C, H, W] feature map / gradient 로부터 샘플별 Grad-CAM([N, H, W], device 유지)을 계산합니다.
+
+    channel 가중합을 하나의 tensor contraction 으로 계산하며, calculate_grad_cam 을
+    샘플마다 호출한 것과 같은 값을 냅니다 (단, 모든 값이 같은 map 은 NaN 대신 0).
+    """
+    import torch
+
+    pooled_gradients = gradients.mean(dim=[2, 3])  # [N, C]
+    grad_cams = torch.einsum('nc,nchw->nhw', pooled_gradients, feature_maps.detach())
+    grad_cams = torch.relu(grad_cams)  # ReLU 적용
+    # min 을 뺀 뒤 max 로 나누는 기존 정규화와 같음
+    return _normalize_per_sample(grad_cams)
+
+
+class GradCamEngine:
+    def __init__(self, generator, boundary, device, target_layers, layer_percentages, target_resolution):
+        self.generator = generator
+        self.boundary = boundary
+        self.device = device
+        self.target_layers = list(target_layers)
+        self.layer_percentages = layer_percentages
+        self.target_resolution = target_resolution
+
+    def feature_maps(self, codes):
+        """codes([N, L, D])에 대해 한 번의 forward 로 대상 레이어의 feature map 을 모읍니다."""
+        import torch
+
+        synthesis = self.generator.net.synthesis
+        last_layer = max(self.target_layers)
+        feature_maps = {}
+        hooks = []
+
+        def make_hook(layer_idx):
+            def forward_hook(module, input, output):
+                feature_maps[layer_idx] = output
+                if layer_idx == last_layer:
+                    raise _StopForward()
+            return forward_hook
+
+        for layer_idx in self.target_layers:
+            layer = getattr(synthesis, f'layer{layer_idx}')
+            hooks.append(layer.register_forward_hook(make_hook(layer_idx)))
+
+        try:
+            with torch.no_grad():
+                synthesis(codes)
+        except _StopForward:
+            pass
+        finally:
+            # Hook 제거
+            for hook in hooks:
+                hook.remove()
+
+        return feature_maps
+
+    def gradients(self, feature_maps):
+        """레이어별 top channel score 의 gradient 를 한 번의 backward 로 계산합니다."""
+        import torch
+
+        leaves = {}
+        total_score = 0
+        for layer_idx, feature_map in feature_maps.items():
+            leaf = feature_map.detach().requires_grad_(True)
+            leaves[layer_idx] = leaf
+            num_channels = leaf.shape[1]
+
+            boundary_layer = self.boundary[0, :num_channels]
+            boundary_broadcasted = torch.tensor(boundary_layer[:, np.newaxis, np.newaxis]).to(self.device)
+
+            influence_map = torch.sum(leaf.detach() * boundary_broadcasted, dim=[2, 3])  # [N, C]
+            top_percentage = self.layer_percentages.get(layer_idx, 0.1)
+            num_top_channels = max(1, int(num_channels * top_percentage))
+            top_channels = torch.argsort(influence_map, dim=1, descending=True)[:, :num_top_channels]
+
+            # 샘플별로 선택된 channel 만 합산하는 score
+            channel_mask = torch.zeros(influence_map.shape, dtype=leaf.dtype, device=leaf.device)
+            channel_mask.scatter_(1, top_channels, 1.0)
+            total_score = total_score + torch.sum(leaf * channel_mask[:, :, None, None])
+
+        layer_indices = list(leaves)
+        grads = torch.autograd.grad(total_score, [leaves[idx] for idx in layer_indices])
+        return dict(zip(layer_indices, grads))
+
+    def grad_cams(self, codes):
+        """{layer_idx: [N, H, W] Grad-CAM tensor} 를 반환합니다."""
+        feature_maps = self.feature_maps(codes)
+        gradients = self.gradients(feature_maps)
+        return {
+            layer_idx: batched_grad_cam(feature_map, gradients[layer_idx])
+            for layer_idx, feature_map in feature_maps.items()
+        }
+
+    def aggregate(self, negative_codes, positive_codes):
+        """조작 전/후 code([B, L, D]) 쌍의 ΔGrad-CAM 을 레이어별로 누적해 [B, H, W] heatmap 을 반환합니다."""
+        import torch
+        import torch.nn.functional as F
+
+        batch_size = len(negative_codes)
+        codes = np.concatenate([negative_codes, positive_codes], axis=0)
+        codes = torch.from_numpy(codes).float().to(self.device)
+        grad_cams = self.grad_cams(codes)
+
+        width, height = self.target_resolution
+        aggregate_grad_cams = torch.zeros((batch_size, height, width), device=self.device)
+        for layer_idx in self.target_layers:
+            layer_cams = grad_cams[layer_idx]
+
+            # ΔGrad-CAM 계산: (diff / (max - min)) 을 [0, 1] 로 clip
+            grad_cam_diff = layer_cams[batch_size:] - layer_cams[:batch_size]
+            flat = grad_cam_diff.flatten(1)
+            value_range = (flat.max(dim=1).values - flat.min(dim=1).values)[:, None, None]
+            grad_cam_diff = torch.where(
+                value_range > 0, grad_cam_diff / value_range.clamp_min(1e-12), torch.zeros_like(grad_cam_diff))
+            grad_cam_diff = grad_cam_diff.clamp(0, 1)
+
+            # Heatmap 크기 정규화 후 누적 (cv2.resize INTER_LINEAR 와 같은 half-pixel bilinear)
+            aggregate_grad_cams += F.interpolate(
+                grad_cam_diff[:, None], size=(height, width), mode='bilinear', align_corners=False)[:, 0]
+
+        return aggregate_grad_cams.cpu().numpy()
+
+
+def reference_aggregate(engine, negative_code, positive_code):
+    """기존 레이어별/코드별 forward-backward 루프 구현 ([L, D] 코드 한 쌍).
+
+    GradCamEngine.aggregate 결과와 비교하는 용도로만 사용합니다.
+    """
+    import cv2
+    import torch
+
+    generator = engine.generator
+    aggregate_grad_cam = None
+
+    for layer_idx in engine.target_layers:
+        grad_cams = []
+        layer = getattr(generator.net.synthesis, f'layer{layer_idx}')
+        for latent_code in (negative_code, positive_code):
+            captured = {}
+
+            def forward_hook(module, input, output):
+                captured['feature_map'] = output
+
+            def backward_hook(module, grad_in, grad_out):
+                captured['gradients'] = grad_out[0]
+
+            hooks = [layer.register_forward_hook(forward_hook), layer.register_backward_hook(backward_hook)]
+
+            latent_code = torch.from_numpy(latent_code).unsqueeze(0).float().to(engine.device)
+            latent_code.requires_grad = True
+            generator.net.synthesis(latent_code)
+
+            feature_map = captured['feature_map']
+            num_channels = feature_map.shape[1]
+            boundary_layer = engine.boundary[0, :num_channels]
+            boundary_broadcasted = torch.tensor(boundary_layer[:, np.newaxis, np.newaxis]).to(engine.device)
+            influence_map = torch.sum(feature_map * boundary_broadcasted, dim=[2, 3])
+            num_top_channels = max(1, int(num_channels * engine.layer_percentages.get(layer_idx, 0.1)))
+            top_channels = torch.argsort(influence_map[0], descending=True)[:num_top_channels]
+
+            score = torch.sum(feature_map[0, top_channels])
+            generator.net.zero_grad()
+            score.backward(retain_graph=True)
+            grad_cams.append(calculate_grad_cam(feature_map, captured['gradients']))
+
+            for hook in hooks:
+                hook.remove()
+
+        grad_cam_diff = grad_cams[1] - grad_cams[0]
+        grad_cam_diff = np.clip(grad_cam_diff / (grad_cam_diff.max() - grad_cam_diff.min()), 0, 1)
+        grad_cam_diff_resized = cv2.resize(grad_cam_diff, engine.target_resolution)
+        if aggregate_grad_cam is None:
+            aggregate_grad_cam = grad_cam_diff_resized
+        else:
+            aggregate_grad_cam += grad_cam_diff_resized
+
+    return aggregate_grad_cam
+
+
+def benchmark(channels=(256, 512), size=64, batch_size=2, repeat=20, device='cpu'):
+    """기존 channel 루프(calculate_grad_cam)와 batched_grad_cam 의 속도와 최대 오차를 비교합니다."""
+    import time
+
+    import torch
+
+    results = []
+    for num_channels in channels:
+        torch.manual_seed(0)
+        feature_maps = torch.randn(batch_size, num_channels, size, size, device=device)
+        gradients = torch.randn(batch_size, num_channels, size, size, device=device)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            expected = np.stack([
+                calculate_grad_cam(feature_maps[n:n + 1], gradients[n:n + 1]) for n in range(batch_size)
+            ])
+        loop_time = (time.perf_counter() - started) / repeat
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            actual = batched_grad_cam(feature_maps, gradients).cpu().numpy()
+        batched_time = (time.perf_counter() - started) / repeat
+
+        max_error = float(np.nanmax(np.abs(expected - actual)))
+        results.append((num_channels, loop_time, batched_time, max_error))
+        print(f"C={num_channels:4d}  loop {loop_time * 1000:8.2f}ms  batched {batched_time * 1000:8.2f}ms  "
+              f"x{loop_time / batched_time:6.1f}  max|diff| {max_error:.2e}")
+    return results
+
+
+def check_agreement(engine, negative_codes, positive_codes, atol=1e-3):
+    """GradCamEngine.aggregate 와 기존 루프(reference_aggregate)의 heatmap 최대 절대 오차를 확인합니다.
+
+    같은 code 쌍([B, L, D])에 대해 두 구현을 실행하므로 _StopForward 조기 종료, leaf 에 대한 한 번의
+    autograd.grad, cv2.resize 대신 F.interpolate 를 쓰는 부분이 모두 기존 경로와 비교됩니다.
+    오차가 atol 을 넘으면 AssertionError 를 던지고, 최대 오차를 반환합니다.
+    """
+    negative_codes = np.asarray(negative_codes, dtype=np.float32)
+    positive_codes = np.asarray(positive_codes, dtype=np.float32)
+    fused = engine.aggregate(negative_codes, positive_codes)
+    reference = np.stack([
+        reference_aggregate(engine, negative_code, positive_code)
+        for negative_code, positive_code in zip(negative_codes, positive_codes)
+    ])
+    assert fused.shape == reference.shape, f"shape mismatch: {fused.shape} != {reference.shape}"
+    max_error = float(np.max(np.abs(fused - reference)))
+    assert max_error <= atol, f"fused aggregate differs from reference: max|diff| {max_error:.2e} > {atol:.0e}"
+    return max_error
+
+
+def toy_engine(num_layers=14, channels=32, latent_dim=64, target_layers=range(6, 12),
+               target_resolution=(256, 256), seed=0, device='cpu'):
+    """HiGAN 가중치 없이 agreement check 를 돌리기 위한 작은 synthesis 네트워크와 GradCamEngine.
+
+    StyleGAN 처럼 `generator.net.synthesis.layer{i}` 가 code 의 i 번째 행으로 변조된 feature map 을 내고,
+    짝수 레이어마다 해상도가 두 배가 됩니다. 마지막 대상 레이어 뒤에도 레이어가 있어 조기 종료가 의미를 가집니다.
+    """
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+
+    class ToyLayer(nn.Module):
+        def __init__(self, upsample):
+            super().__init__()
+            self.upsample = upsample
+            self.conv = nn.Conv2d(channels, channels, 3, padding=1)
+            self.style = nn.Linear(latent_dim, channels)
+
+        def forward(self, x, w):
+            if self.upsample:
+                x = F.interpolate(x, scale_factor=2, mode='nearest')
+            x = self.conv(x) * (1 + self.style(w))[:, :, None, None]
+            return F.leaky_relu(x, 0.2)
+
+    class ToySynthesis(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.const = nn.Parameter(torch.randn(1, channels, 4, 4))
+            for i in range(num_layers):
+                setattr(self, f'layer{i}', ToyLayer(upsample=i > 0 and i % 2 == 0))
+
+        def forward(self, codes):
+            x = self.const.expand(codes.shape[0], -1, -1, -1)
+            for i in range(num_layers):
+                x = getattr(self, f'layer{i}')(x, codes[:, i])
+            return x
+
+    class ToyGenerator:
+        pass
+
+    torch.manual_seed(seed)
+    generator = ToyGenerator()
+    generator.net = nn.Module()
+    generator.net.synthesis = ToySynthesis().to(device)
+    boundary = np.random.RandomState(seed).randn(1, latent_dim).astype(np.float32)
+    layer_percentages = {layer_idx: 0.5 for layer_idx in target_layers}
+    return GradCamEngine(generator, boundary, device, target_layers, layer_percentages, target_resolution)
+
+
+def toy_agreement_check(batch_size=2, atol=1e-3, **kwargs):
+    """toy_engine 으로 fused/reference 일치와 마지막 대상 레이어 이후 synthesis 생략을 확인합니다."""
+    import torch
+
+    engine = toy_engine(**kwargs)
+    synthesis = engine.generator.net.synthesis
+    num_layers = len([name for name, _ in synthesis.named_children() if name.startswith('layer')])
+    latent_dim = engine.boundary.shape[1]
+
+    # 조기 종료 확인: fused forward 에서는 마지막 대상 레이어 다음 레이어가 실행되지 않아야 함
+    calls = []
+    next_layer = getattr(synthesis, f'layer{max(engine.target_layers) + 1}', None)
+    hook = next_layer.register_forward_hook(lambda *args: calls.append(1)) if next_layer is not None else None
+    rng = np.random.RandomState(1)
+    codes = rng.randn(batch_size, num_layers, latent_dim).astype(np.float32)
+    try:
+        engine.feature_maps(torch.from_numpy(codes))
+    finally:
+        if hook is not None:
+            hook.remove()
+    assert not calls, "synthesis continued past the last target layer"
+
+    negative_codes = codes
+    positive_codes = codes + 0.5 * engine.boundary[None].astype(np.float32)
+    max_error = check_agreement(engine, negative_codes, positive_codes, atol=atol)
+    print(f"toy agreement: B={batch_size}  max|diff| {max_error:.2e} (atol {atol:.0e})")
+    return max_error
+
+
+def higan_agreement_check(params=((10, 449, 4), (10, 449, 7)), atol=1e-3):
+    """실제 HiGAN generator/boundary 로 갤러리 샘플의 조작 전/후 code 에 대해 agreement 를 확인합니다."""
+    from higan_engine import MANIPULATE_DISTANCES, STEP_INDEX, HiganEngine, sample_codes_at
+
+    engine = HiganEngine().load_models()
+    wp_codes = sample_codes_at(engine.generator, list(params), engine.w1k_code)
+    negative_codes, positive_codes = [
+        engine.manipulate_codes(wp_codes, distance)[:, STEP_INDEX] for distance in MANIPULATE_DISTANCES]
+    max_error = check_agreement(engine.grad_cam_engine, negative_codes, positive_codes, atol=atol)
+    print(f"HiGAN agreement: {len(params)} samples  max|diff| {max_error:.2e} (atol {atol:.0e})")
+    return max_error
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Grad-CAM 벤치마크와 fused/기존 구현 일치 확인")
+    parser.add_argument('--check', choices=['toy', 'higan'],
+                        help="GradCamEngine.aggregate 와 기존 루프 구현의 heatmap 일치를 확인합니다.")
+    args = parser.parse_args()
+    if args.check == 'toy':
+        toy_agreement_check()
+    elif args.check == 'higan':
+        higan_agreement_check()
+    else:
+        benchmark()
@@ -0,0 +1,180 @@
+"""Heatmap 추천 위치 클러스터링
+
+임계값 이상인 heatmap 픽셀을 추천 위치 후보 클러스터로 묶습니다. 결과는 항상
+{cluster_id: (points [K, 2] (y, x), values [K])} 형식입니다.
+
+- 'components' (기본값): 임계값 마스크를 eps/2 반경으로 팽창시킨 뒤 8-연결 성분으로 라벨링합니다.
+  eps 이내로 떨어진 덩어리를 하나로 묶는 DBSCAN 의 동작을 근사하며, min_samples 보다 작은
+  성분은 noise 로 버립니다. cluster_resolution 을 주면 그 해상도에서 라벨링한 뒤
+  라벨을 원래 해상도로 올려 픽셀에 할당합니다.
+  레이어별 native 해상도에서 클러스터링하지 않고, 레이어 6~11 을 TARGET_RESOLUTION 으로 올려 누적한
+  aggregate heatmap 을 cluster_resolution 으로 다시 줄여 라벨링합니다. 추천 위치는 누적된 heatmap 하나에서
+  정해지고 레이어마다 해상도가 달라 공통의 native 해상도가 없기 때문입니다 (의도적인 대체).
+- 'dbscan': 기존 sklearn DBSCAN 구현
+"""
+import time
+
+import numpy as np
+
+DEFAULT_METHOD = 'components'
+
+
+# Heatmap 클러스터링 함수 (DBSCAN 활용)
+def cluster_heatmap_with_dbscan(heatmap, eps=3, min_samples=5, prob_threshold=0.5):
+    from sklearn.cluster import DBSCAN
+
+    high_prob_indices = np.argwhere(heatmap >= prob_threshold)
+    high_prob_values = heatmap[heatmap >= prob_threshold]
+    if len(high_prob_indices) == 0:
+        return {}
+
+    db = DBSCAN(eps=eps, min_samples=min_samples).fit(high_prob_indices)
+    labels = db.labels_
+
+    clusters = {}
+    for cluster_id in set(labels):
+        if cluster_id == -1:  # Noise 처리
+            continue
+        cluster_points = high_prob_indices[labels == cluster_id]
+        cluster_values = high_prob_values[labels == cluster_id]
+        clusters[cluster_id] = (cluster_points, cluster_values)
+
+    return clusters
+
+
+def cluster_heatmap_with_components(heatmap, eps=3, min_samples=5, prob_threshold=0.5, cluster_resolution=None):
+    import cv2
+
+    mask = heatmap >= prob_threshold
+    height, width = heatmap.shape
+
+    if cluster_resolution is not None and tuple(cluster_resolution) != (width, height):
+        # 낮은 해상도에서 라벨링 (eps 도 같은 비율로 축소)
+        low_width, low_height = cluster_resolution
+        low_heatmap = cv2.resize(heatmap.astype(np.float32), (low_width, low_height), interpolation=cv2.INTER_AREA)
+        low_mask = low_heatmap >= prob_threshold
+        scale = min(low_width / width, low_height / height)
+        labels = _label(low_mask, eps * scale)
+        labels = cv2.resize(labels, (width, height), interpolation=cv2.INTER_NEAREST)
+    else:
+        labels = _label(mask, eps)
+
+    points = np.argwhere(mask)
+    values = heatmap[mask]
+    point_labels = labels[mask]
+
+    clusters = {}
+    for label in np.unique(point_labels):
+        if label == 0:  # 배경 (저해상도 라벨링에서 누락된 픽셀)
+            continue
+        selected = point_labels == label
+        if np.count_nonzero(selected) < min_samples:  # Noise 처리
+            continue
+        clusters[len(clusters)] = (points[selected], values[selected])
+
+    return clusters
+
+
+def _label(mask, eps):
+    import cv2
+
+    mask = mask.astype(np.uint8)
+    radius = int(eps // 2)
+    if radius > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+        mask = cv2.dilate(mask, kernel)
+    _, labels = cv2.connectedComponents(mask, connectivity=8, ltype=cv2.CV_32S)
+    return labels
+
+
+CLUSTERING_METHODS = {
+    'components': cluster_heatmap_with_components,
+    'dbscan': cluster_heatmap_with_dbscan,
+}
+
+
+def cluster_heatmap(heatmap, method=DEFAULT_METHOD, **kwargs):
+    """선택한 방식으로 heatmap 을 클러스터링합니다."""
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"Unknown clustering method: {method}. Choose from {sorted(CLUSTERING_METHODS)}")
+    if method == 'dbscan':
+        kwargs.pop('cluster_resolution', None)
+    return CLUSTERING_METHODS[method](heatmap, **kwargs)
+
+
+def cluster_centers(clusters, max_clusters=None):
+    """Heat 평균이 높은 순서로 정렬한 클러스터 중심 좌표 [(y, x)] 를 반환합니다."""
+    ordered = sorted(clusters.values(), key=lambda cluster: np.mean(cluster[1]), reverse=True)
+    return [np.mean(points, axis=0) for points, _ in ordered[:max_clusters]]
+
+
+def compare_methods(heatmap, max_clusters=3, tolerance=None, **kwargs):
+    """DBSCAN 과 components 방식의 실행 시간과 상위 클러스터 중심 거리를 비교합니다.
+
+    반환값의 center_distances 는 DBSCAN 상위 중심마다 가장 가까운 components 중심까지의 거리(px)입니다.
+    tolerance(px)를 주면 상위 클러스터 수가 다르거나 거리가 tolerance 를 넘을 때 AssertionError 를 던집니다.
+    """
+    timings, centers = {}, {}
+    for method in ('dbscan', 'components'):
+        started = time.perf_counter()
+        clusters = cluster_heatmap(heatmap, method=method, **kwargs)
+        timings[method] = time.perf_counter() - started
+        centers[method] = cluster_centers(clusters, max_clusters)
+
+    distances = []
+    for center in centers['dbscan']:
+        if centers['components']:
+            distances.append(float(min(np.linalg.norm(center - other) for other in centers['components'])))
+        else:
+            distances.append(float('inf'))
+
+    if tolerance is not None:
+        assert len(centers['dbscan']) == len(centers['components']), \
+            f"top cluster count differs: dbscan {len(centers['dbscan'])} != components {len(centers['components'])}"
+        worst = max(distances, default=0.0)
+        assert worst <= tolerance, f"cluster centers disagree: max distance {worst:.2f}px > {tolerance:.2f}px"
+
+    return {
+        "timings": timings,
+        "num_clusters": {method: len(value) for method, value in centers.items()},
+        "center_distances": distances,
+    }
+
+
+def synthetic_heatmap(size=256, num_blobs=4, seed=0):
+    """벤치마크용 가우시안 blob heatmap ([0, 1] 정규화)"""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:size, 0:size]
+    heatmap = np.zeros((size, size), dtype=np.float32)
+    for _ in range(num_blobs):
+        cy, cx = rng.uniform(0.15, 0.85, 2) * size
+        sigma = rng.uniform(0.04, 0.1) * size
+        heatmap += rng.uniform(0.6, 1.0) * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * sigma ** 2))
+    heatmap += rng.uniform(0, 0.05, heatmap.shape)
+    return heatmap / heatmap.max()
+
+
+def benchmark(num_heatmaps=10, size=256, tolerance=None, **kwargs):
+    """합성 heatmap 에 대해 두 방식의 속도와 중심 좌표 일치도를 출력합니다.
+
+    tolerance 기본값은 eps px 이며, cluster_resolution 으로 줄여 라벨링하면 축소 배율만큼 늘립니다.
+    중심이 tolerance 보다 멀어지면 AssertionError 로 실패합니다.
+    """
+    kwargs = {'eps': 5, 'min_samples': 40, 'prob_threshold': 0.5, **kwargs}
+    if tolerance is None:
+        tolerance = kwargs['eps']
+        if kwargs.get('cluster_resolution'):
+            tolerance *= max(1.0, size / min(kwargs['cluster_resolution']))
+    for seed in range(num_heatmaps):
+        report = compare_methods(synthetic_heatmap(size, seed=seed), tolerance=tolerance, **kwargs)
+        timings = report["timings"]
+        distances = ", ".join(f"{d:.2f}" for d in report["center_distances"])
+        print(f"seed {seed}: dbscan {timings['dbscan'] * 1000:8.2f}ms  components {timings['components'] * 1000:6.2f}ms  "
+              f"clusters {report['num_clusters']}  center distance [{distances}]")
+    print(f"all center distances within {tolerance:.2f}px")
+
+
+if __name__ == '__main__':
+    benchmark()
+    print("cluster_resolution=(64, 64)")
+    benchmark(cluster_resolution=(64, 64))
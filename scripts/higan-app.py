@@ -1,89 +1,132 @@
 # app.py
+from startup_timer import StartupTimer
+startup_timer = StartupTimer('higan-app')
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import subprocess
 import os
-import uuid
 from pyngrok import ngrok
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
+from higan_engine import HiganEngine
+from job_queue import QueueFull, create_job_queue
+from task_routes import queue_full_response, register_task_routes, submit_task
+from task_store import create_task_store
+startup_timer.mark('imports')
 
 app = Flask(__name__)
 CORS(app)
 
-# --- 비동기 작업 관리 설정 ---
-executor = ThreadPoolExecutor(max_workers=2)
-tasks = {} # 작업 상태를 저장할 딕셔너리
-
 # ngrok 사용을 위한 환경 변수 로드
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 ngrok_token = os.getenv('NGROK_AUTH_TOKEN_higan')
 
+# 작업 상태 저장소 (TTL/항목 수/byte 한도, HIGAN_TASK_STORE=sqlite 이면 여러 프로세스가 공유)
+tasks = create_task_store('HIGAN')
+
+# --- 비동기 작업 관리 설정 ---
+# 대기 작업 수를 HIGAN_QUEUE_DEPTH 로 제한 (가득 차면 429). sampling/Grad-CAM 만 엔진 lock 으로 직렬화되고
+# 클러스터링, 마스크 렌더링, S3 업로드, MongoDB 조회/기록은 lock 밖에서 실행되므로 추가 worker 가 이 단계들을
+# 다른 요청의 모델 계산과 겹쳐 실행합니다.
+job_queue = create_job_queue('HIGAN', memory_per_worker=1024 ** 3, max_workers=4, initial_service_time=20.0)
+
+# --- 상주 HiGAN 엔진 (모델은 프로세스당 한 번만 로드) ---
+engine = HiganEngine()
+
 # --- 백그라운드 실행용 워커 함수 ---
-def background_run_higan(task_id):
+def background_run_higan(task_id, job, debug=False):
     try:
-        tasks[task_id]['status'] = 'processing'
-        
-        # Execute the higan-code.py script
-        script_path = os.path.join(os.path.dirname(__file__), "higan-code.py")
-        print(f"Executing script at: {script_path}")
-        
-        # subprocess
-        result = subprocess.run(
-            ["python", script_path],
-            capture_output=True,   # stdout/stderr
-            text=True              # text
-        )
-        
-        if result.returncode != 0:
-            tasks[task_id].update({
-                'status': 'failed',
-                'error': result.stderr
-            })
-        else:
-            tasks[task_id].update({
-                'status': 'completed',
-                'result': {
-                    "message": "Higan script executed successfully",
-                    "output": result.stdout
-                }
-            })
-            
+        tasks.update(task_id, {'status': 'processing'})
+
+        # 요청마다 sample → Grad-CAM → cluster → mask 단계만 실행 (단계는 'stage' 로 알림)
+        result = engine.run(debug=debug, progress=lambda stage: tasks.update(task_id, {'stage': stage}), **job)
+
+        tasks.update(task_id, {
+            'status': 'completed',
+            'result': {
+                "message": "Higan script executed successfully",
+                **result
+            }
+        })
+
     except Exception as e:
         print(f"Unexpected worker error: {e}")
-        tasks[task_id].update({
+        tasks.update(task_id, {
             'status': 'failed',
             'error': str(e)
         })
 
+def background_run_higan_batch(task_id, items, debug=False):
+    try:
+        tasks.update(task_id, {'status': 'processing'})
+
+        # 여러 이미지를 배치로 묶어 sampling, manipulation, Grad-CAM 을 한 번에 실행
+        results = engine.run_batch(items, debug=debug)
+
+        tasks.update(task_id, {
+            'status': 'completed',
+            'result': {
+                "message": "Higan batch executed successfully",
+                "results": results
+            }
+        })
+
+    except Exception as e:
+        print(f"Unexpected worker error: {e}")
+        tasks.update(task_id, {
+            'status': 'failed',
+            'error': str(e)
+        })
+
+# body: {"image_id": ...} 또는 {"image_name": ...} 또는 {"image_url": ...} (없으면 가장 최근 이미지)
 @app.route('/run-higan', methods=['POST'])
 def run_higan():
-    # 새로운 작업 ID 생성
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {'status': 'queued'}
-    
-    # 백그라운드 스레드에서 작업 시작
-    executor.submit(background_run_higan, task_id)
-    
+    data = request.get_json(silent=True) or {}
+    job = {key: data.get(key) for key in ("image_id", "image_name", "image_url") if data.get(key)}
+    if any(not isinstance(value, str) for value in job.values()):
+        return jsonify({"error": "'image_id', 'image_name' and 'image_url' must be strings"}), 400
+
+    # 새로운 작업을 만들어 큐에 넣음 (큐가 가득 차면 429 + Retry-After)
+    try:
+        task_id = submit_task(tasks, job_queue, background_run_higan, job, bool(data.get("debug")))
+    except QueueFull as e:
+        return queue_full_response(e)
+
     # 클라이언트에게 즉시 task_id 반환
     return jsonify({
         "message": "Higan script execution started",
         "task_id": task_id
     }), 202
 
-# 작업 상태를 확인하는 엔드포인트 추가
-@app.route('/task_status/<task_id>', methods=['GET'])
-def get_task_status(task_id):
-    task = tasks.get(task_id)
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
-    return jsonify(task), 200
+# 여러 이미지에 대한 추천을 한 번에 요청하는 엔드포인트
+# body: {"items": ["10_449_4.png", {"num_sample": 10, "noise_seed": 449, "image_num": 4}, ...]}
+@app.route('/run-higan-batch', methods=['POST'])
+def run_higan_batch():
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'items' must be a non-empty list"}), 400
+
+    try:
+        task_id = submit_task(tasks, job_queue, background_run_higan_batch, items, bool(data.get("debug")))
+    except QueueFull as e:
+        return queue_full_response(e)
+
+    return jsonify({
+        "message": "Higan batch execution started",
+        "task_id": task_id
+    }), 202
+
+# 작업 상태를 확인하는 엔드포인트: /task_status/<task_id> (?wait=&since= long-poll), /task_events/<task_id> (SSE)
+register_task_routes(app, tasks, job_queue)
 
 # 로컬에서 실행할 때
 # if __name__ == '__main__':
 #     app.run(host='0.0.0.0', port=8000)
 
 if __name__ == '__main__':
+    # 모델을 미리 로드 (의존성/가중치 준비는 bootstrap.py 에서 수행)
+    engine.load(timer=startup_timer)
+
     # ngrok 인증 및 터널 생성
     PORT = 8000
     if ngrok_token:
@@ -101,6 +144,8 @@ if __name__ == '__main__':
             print(f"ngrok 연결 실패: {e}")
     else:
         print("경고: NGROK_AUTH_TOKEN이 설정되지 않았습니다. 로컬에서만 접속 가능합니다.")
+    startup_timer.mark('ngrok')
+    startup_timer.report()
 
     # Flask 실행 (debug=True 사용 시 use_reloader=False 권장)
     # use_reloader=False를 안 하면 ngrok 터널이 두 번 실행되려다 에러가 날 수 있습니다.
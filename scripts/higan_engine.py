@@ -0,0 +1,680 @@
+"""HiGAN 조명 추천 엔진
+
+higan-code.py 의 로직을 import 가능한 형태로 옮긴 모듈입니다.
+모델, boundary, order_w_1k.npy 는 `HiganEngine.load()` 에서 한 번만 준비하고,
+요청마다 `HiganEngine.run()` 으로 sample → Grad-CAM → cluster → mask 단계만 실행합니다.
+"""
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+
+import artifact_store
+import model_registry
+from bootstrap import HIGAN_DIR, ORDER_W_FILENAME, higan_artifacts
+from gallery_index import GalleryIndex
+from grad_cam import GradCamEngine
+from heatmap_clustering import cluster_heatmap
+from latent_store import LatentStore
+from mask_render import SCALING_FACTOR, cluster_geometry, encode_png, rasterize_ellipses
+from result_cache import cache_key, create_result_cache, version_hash
+from s3_uploader import S3Uploader, UploadJob
+from startup_timer import StartupTimer
+
+DOTENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env.local')
+
+MODEL_NAME = 'stylegan_bedroom'
+ATTRIBUTE_NAME = 'indoor_lighting'
+BOUNDARY_NAME = f'{ATTRIBUTE_NAME}_boundary.npy'
+
+TARGET_LAYERS = range(6, 12)  # Layer 6~11
+LAYER_PERCENTAGES = {6: 1.0, 7: 1.0, 8: 1.0, 9: 1.0, 10: 1.0, 11: 1.0}  # 레이어별 비율 설정
+TARGET_RESOLUTION = (256, 256)  # 원하는 Heatmap 해상도 (e.g., 최종 이미지 해상도)
+STEP_INDEX = 1  # 0: 조작 전, 1: 조작 후 상태
+MANIPULATE_DISTANCES = (-3, 3)  # {min: -3.0, max: 3.0, step: 0.1}
+MAX_RECOMMEND = 3  # 최대 표시할 recommend 개수
+CLUSTER_PARAMS = {'eps': 5, 'min_samples': 40, 'prob_threshold': 0.5}
+MONGO_MAX_POOL_SIZE = 10
+# 추천 실행에 필요한 문서 필드만 가져옵니다.
+DOCUMENT_PROJECTION = {"image_name": 1, "s3_url": 1, "uploaded_at": 1}
+MAX_BATCH_CHUNK = 32
+BYTES_PER_BATCH_ITEM = 256 * 1024 * 1024  # 배치 항목 하나당 예상 메모리 (chunk 크기 계산용)
+
+
+def to_wp_codes(model, latent_codes):
+    """W 공간 latent code 를 WP 공간으로 변환합니다."""
+    # 잠재 코드의 차원 확인 및 조정
+    if latent_codes.ndim == 1:
+        # 예상한 차원이 아닌 경우, 512 차원으로 확장
+        latent_codes = latent_codes.reshape(1, -1)
+        if latent_codes.shape[1] != 512:
+            latent_codes = np.tile(latent_codes, (1, 512 // latent_codes.shape[1]))
+
+    if latent_codes.ndim == 2 and latent_codes.shape[1] != 512:
+        raise ValueError(f"Invalid latent codes shape: {latent_codes.shape}. Expected [batch_size, 512].")
+
+    # 모델로부터 잠재 코드 변환
+    return model.easy_synthesize(
+        latent_codes=latent_codes,
+        latent_space_type='w',
+        generate_style=False,
+        generate_image=False
+    )['wp']
+
+
+def sample_codes(model, num, seed=0, w1k_code=None):
+    """Samples latent codes randomly."""
+    np.random.seed(seed)
+
+    if w1k_code is None:
+        latent_codes = model.easy_sample(num)
+    else:
+        latent_codes = w1k_code[np.random.randint(0, w1k_code.shape[0], num)]
+
+    return to_wp_codes(model, latent_codes)
+
+
+def sample_code_index(num, seed, sample_index, bank_size):
+    """sample_codes 와 같은 난수 추출을 재현해 sample_index 번째 코드의 bank 인덱스를 반환합니다."""
+    if not 0 <= sample_index < num:
+        raise IndexError(f"sample_index ({sample_index}) is out of bounds for num_sample {num}")
+    np.random.seed(seed)
+    return np.random.randint(0, bank_size, num)[sample_index]
+
+
+def sample_single_code(model, num, seed, sample_index, w1k_code):
+    """sample_codes(model, num, seed, w1k_code)[sample_index:sample_index + 1] 과 같은 결과를
+    해당 코드 하나만 WP 공간으로 변환해 얻습니다. 반환 shape 은 [1, L, D] 입니다.
+    """
+    return sample_codes_at(model, [(num, seed, sample_index)], w1k_code)
+
+
+def sample_codes_at(model, params, w1k_code):
+    """(num_sample, noise_seed, sample_index) 목록에 해당하는 코드들을 한 번에 WP 공간으로 변환합니다.
+
+    W → WP 변환은 샘플별 연산이므로 결과는 각각 sample_single_code 로 구한 것과 같습니다.
+    """
+    bank_indices = [
+        sample_code_index(num, seed, sample_index, w1k_code.shape[0])
+        for num, seed, sample_index in params
+    ]
+    return to_wp_codes(model, np.array(w1k_code[bank_indices]))
+
+
+def load_boundary(boundary_name, base_dir):
+    """Boundary 파일을 로드합니다. 사전 형식이 아니면 기본 레이어를 사용합니다."""
+    path = os.path.join(base_dir, boundary_name)
+    try:
+        boundary_file = np.load(path, allow_pickle=True).item()  # 파일을 사전 형식으로 로드
+        boundary = boundary_file['boundary']
+        manipulate_layers = boundary_file['meta_data']['manipulate_layers']
+    except ValueError:
+        # Boundary 파일이 사전 형식이 아닌 경우 처리
+        boundary = np.load(path)
+        manipulate_layers = '6-11'
+    print(f"Boundary 로드 성공: {path}")
+    return boundary, manipulate_layers
+
+
+def cluster_metadata(geometry):
+    """mask_images 항목에 기록하는 클러스터 중심(소수 둘째 자리)과 id(1부터)"""
+    cluster_center = geometry["center"]
+    return {
+        "cluster_center": {"y": round(float(cluster_center[0]), 2), "x": round(float(cluster_center[1]), 2)},
+        "cluster_id": int(geometry["cluster_id"]) + 1
+    }
+
+
+def mask_key(image_name, filename):
+    """이미지별 마스크/오버레이 S3 key"""
+    return f'{image_name}-masks/{filename}'
+
+
+def parse_image_name(image_name):
+    """이미지 이름(num_sample_noise_seed_image_num)에서 숫자 3개를 추출합니다."""
+    numbers = list(map(int, re.findall(r'\d+', image_name or '')))
+    print(f"Debug: Extracted numbers: {numbers}")
+    if len(numbers) != 3:
+        raise ValueError(f"'image_name' does not contain exactly 3 components: {image_name}")
+    return tuple(numbers)
+
+
+class HiganEngine:
+    """모델과 외부 클라이언트를 한 번 로드해 두고 요청마다 추천 단계만 실행하는 엔진"""
+
+    def __init__(self, code_dir=HIGAN_DIR, device=None, latent_store_dir=None):
+        self.code_dir = os.path.abspath(code_dir)
+        self.device = device
+        # 조작된 latent code 를 mmap 파일로 공유하는 저장소 (선택, 모델 버전별 디렉터리는 load_models 에서 열기)
+        self.latent_store_dir = latent_store_dir or os.getenv('HIGAN_LATENT_STORE_DIR')
+        self.latent_store = None
+        # 클러스터링 방식 ('components' 또는 'dbscan')과 라벨링 해상도 (예: "64" → 64x64)
+        self.cluster_method = os.getenv('HIGAN_CLUSTER_METHOD', 'components')
+        cluster_resolution = os.getenv('HIGAN_CLUSTER_RESOLUTION')
+        self.cluster_resolution = (int(cluster_resolution),) * 2 if cluster_resolution else None
+        # precompute-gallery.py 로 만든 갤러리 인덱스 (선택)
+        gallery_index_path = os.getenv('HIGAN_GALLERY_INDEX')
+        self.gallery_index = GalleryIndex(gallery_index_path, readonly=True) if gallery_index_path else None
+        self.loaded = False
+        self.clients_loaded = False
+        self.result_cache = None
+        self._result_version = None
+        # 공유 generator 에 hook 을 등록하므로 동시에 하나의 요청만 모델을 사용합니다.
+        # (sampling, manipulation, Grad-CAM, 디버그 이미지 합성만 잡고 클러스터링/렌더링/업로드는 밖에서 실행)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self, timer=None):
+        """Generator, boundary, order_w_1k.npy, MongoDB/S3 클라이언트를 한 번만 준비합니다.
+
+        의존성 설치나 저장소 클론은 하지 않습니다 (bootstrap.py 참고).
+        """
+        timer = timer or StartupTimer('higan-engine')
+        self.load_models(timer)
+        self.load_clients(timer)
+        return self
+
+    def load_models(self, timer=None):
+        """Generator, boundary, order_w_1k.npy 만 준비합니다 (오프라인 precompute 용)."""
+        timer = timer or StartupTimer('higan-engine')
+        with self._load_lock:
+            if self.loaded:
+                return self
+            self._load_models(timer)
+            # 가중치가 준비된 뒤의 해시로 캐시 버전을 다시 계산 (요청 스레드는 계산된 값만 읽음)
+            self._result_version = self._compute_result_version()
+            if self.latent_store_dir:
+                self.latent_store = LatentStore(self.latent_store_dir, self.model_version())
+            self.loaded = True
+        return self
+
+    def load_clients(self, timer=None):
+        """MongoDB/S3 클라이언트와 결과 캐시만 준비합니다. 캐시 hit 은 모델 없이 처리됩니다."""
+        timer = timer or StartupTimer('higan-engine')
+        with self._load_lock:
+            if self.clients_loaded:
+                return self
+            with timer.phase('mongo/s3 clients'):
+                self._load_clients()
+                self.result_cache = create_result_cache(self.uploader.s3, self.bucket_name)
+            # 캐시 조회는 모델 로드 전에도 일어나므로 여기서도 버전을 미리 계산
+            if self._result_version is None:
+                self._result_version = self._compute_result_version()
+            self.clients_loaded = True
+        return self
+
+    def _load_models(self, timer):
+        with timer.phase('import torch'):
+            import torch
+
+        # 경로 및 모듈 설정
+        if self.code_dir not in sys.path:
+            sys.path.append(self.code_dir)
+
+        with timer.phase('import higan'):
+            from utils.editor import get_layerwise_manipulation_strength
+
+        # Define device
+        if self.device is None:
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"Using device: {self.device}")
+
+        # 가중치와 latent bank 확인만 수행 (다운로드는 bootstrap.py 에서, 없으면 즉시 실패)
+        with timer.phase('artifacts'):
+            try:
+                artifact_store.ensure_all(higan_artifacts(self.code_dir), offline=True)
+            except artifact_store.ArtifactMissingError as e:
+                raise artifact_store.ArtifactMissingError(
+                    f"{e} - 먼저 `python scripts/bootstrap.py higan` 을 실행하세요.") from e
+
+        # order_w.npy 로드 (mmap 으로 열어 워커 간 page cache 공유)
+        with timer.phase('order_w_1k.npy'):
+            order_w_path = os.path.join(self.code_dir, ORDER_W_FILENAME)
+            self.w1k_code = np.load(order_w_path, mmap_mode='r')
+        print("w1k_code 로드 성공!")
+
+        # sampling, synthesis, Grad-CAM 이 하나의 generator 인스턴스를 공유합니다.
+        with timer.phase('generator'):
+            self.generator = model_registry.get_generator(MODEL_NAME, self.device)
+        print(f"상주 모델 메모리: {model_registry.format_bytes(model_registry.resident_bytes())}")
+
+        # Load boundary
+        with timer.phase('boundary'):
+            self.boundary, self.manipulate_layers = load_boundary(
+                BOUNDARY_NAME, os.path.join(self.code_dir, 'boundaries', MODEL_NAME))
+
+        self.grad_cam_engine = GradCamEngine(
+            self.generator, self.boundary, self.device,
+            TARGET_LAYERS, LAYER_PERCENTAGES, TARGET_RESOLUTION)
+
+        # Strength 설정
+        self.strength = get_layerwise_manipulation_strength(
+            num_layers=self.generator.num_layers,
+            truncation_psi=self.generator.truncation_psi,
+            truncation_layers=self.generator.truncation_layers
+        )
+
+    def _load_clients(self):
+        import certifi
+        from pymongo import MongoClient
+
+        # 환경 변수 로드
+        load_dotenv(DOTENV_PATH)
+        self.aws_s3_region = os.getenv('AWS_S3_REGION')
+        self.bucket_name = os.getenv('AWS_S3_BUCKET_NAME')
+        mongo_uri = os.getenv("MONGODB_URI")
+        if mongo_uri is None:
+            raise Exception("MONGODB_URI 환경 변수가 설정되지 않았습니다.")
+
+        # AWS S3 업로더 생성 (client 와 업로드 스레드 풀을 프로세스 안에서 공유)
+        self.uploader = S3Uploader(self.bucket_name, self.aws_s3_region)
+
+        # MongoDB 클라이언트 생성 (프로세스당 하나, 요청 스레드들이 커넥션 풀을 공유)
+        self.mongo_client = MongoClient(
+            mongo_uri, tlsCAFile=certifi.where(),
+            maxPoolSize=int(os.getenv('MONGODB_MAX_POOL_SIZE', MONGO_MAX_POOL_SIZE)))
+        self.collection = self.mongo_client["lumterior"]["images"]
+        # 최근 문서 조회와 이미지 이름 조회용 인덱스 (이미 있으면 아무 일도 하지 않음)
+        self.collection.create_index([("uploaded_at", -1)])
+        self.collection.create_index("image_name")
+        print("MongoDB 연결 성공!")
+
+    def model_version(self):
+        """generator 가중치, latent bank, boundary 해시로 만든 버전 (latent code 저장소 디렉터리 이름)
+
+        해시는 artifact_store 의 sidecar 메타를 재사용하므로 모델을 로드하지 않습니다.
+        """
+        boundary_path = os.path.join(self.code_dir, 'boundaries', MODEL_NAME, BOUNDARY_NAME)
+        return version_hash(
+            MODEL_NAME,
+            *[artifact_store.recorded_sha256(artifact.path) for artifact in higan_artifacts(self.code_dir)],
+            artifact_store.recorded_sha256(boundary_path),
+        )
+
+    def _compute_result_version(self):
+        return version_hash(
+            self.model_version(),
+            list(TARGET_LAYERS), LAYER_PERCENTAGES, TARGET_RESOLUTION, STEP_INDEX, MANIPULATE_DISTANCES,
+            MAX_RECOMMEND, CLUSTER_PARAMS, self.cluster_method, self.cluster_resolution, SCALING_FACTOR,
+        )
+
+    def result_version(self):
+        """결과에 영향을 주는 모델 버전과 조작/클러스터링 설정으로 만든 캐시 버전
+
+        load_models/load_clients 에서 _load_lock 안에서 한 번 계산합니다.
+        """
+        if self._result_version is None:
+            with self._load_lock:
+                if self._result_version is None:
+                    self._result_version = self._compute_result_version()
+        return self._result_version
+
+    def cached_result(self, image_name, params):
+        """갤러리 인덱스나 결과 캐시에 있는 추천 결과를 반환합니다. 없으면 None 입니다.
+
+        다른 이미지 이름으로 저장된 결과(갤러리 인덱스는 항상)면 마스크를 새 이름으로 업로드합니다.
+        """
+        entry = None
+        if self.result_cache is not None:
+            entry = self.result_cache.get(cache_key(*params, self.result_version()))
+        if entry is None and self.gallery_index is not None:
+            entry = self.gallery_index.get(self.result_version(), *params)
+        if entry is None:
+            return None
+        print(f"Result cache hit: {image_name}")
+        if entry.get("image_name") == image_name:
+            return {"mask_images": entry["mask_images"]}
+
+        mask_filenames = [f"mask_cluster_{i + 1}.png" for i in range(len(entry["mask_images"]))]
+        report = self.uploader.upload_many([
+            UploadJob(mask_key(image_name, mask_filename), data=entry["masks"][mask_filename])
+            for mask_filename in mask_filenames
+        ])
+        if report["errors"]:
+            return None
+
+        mask_images = []
+        for i, (mask_image, mask_filename) in enumerate(zip(entry["mask_images"], mask_filenames)):
+            mask_images.append({
+                f"mask_img_{i + 1}": report["urls"][mask_key(image_name, mask_filename)],
+                "cluster_center": mask_image["cluster_center"],
+                "cluster_id": mask_image["cluster_id"]
+            })
+        return {"mask_images": mask_images}
+
+    def store_result(self, image_name, params, mask_images, masks):
+        """추천 결과(클러스터 중심, 마스크 PNG)를 캐시에 저장합니다."""
+        if self.result_cache is None:
+            return
+        try:
+            self.result_cache.put(cache_key(*params, self.result_version()), {
+                "image_name": image_name,
+                "mask_images": mask_images,
+                "masks": masks,
+            })
+        except OSError as e:
+            print(f"Failed to store result cache entry: {e}")
+
+    def manipulate_codes(self, latent_codes, distance):
+        """boundary 방향으로 latent code 를 distance 만큼 조작합니다."""
+        from utils.editor import manipulate
+
+        return manipulate(
+            latent_codes=latent_codes,
+            boundary=self.boundary,
+            start_distance=0,
+            end_distance=distance,
+            step=2,
+            layerwise_manipulation=True,
+            num_layers=self.generator.num_layers,
+            manipulate_layers=self.manipulate_layers,
+            is_code_layerwise=True,
+            is_boundary_layerwise=False,
+            layerwise_manipulation_strength=self.strength
+        )
+
+    def manipulated_codes(self, params):
+        """(num_sample, noise_seed, image_num) 목록에 대해 MANIPULATE_DISTANCES 별로 조작된
+        latent code([B, Steps, L, D])를 메모리로 반환합니다.
+        """
+        codes = {distance: [None] * len(params) for distance in MANIPULATE_DISTANCES}
+        if self.latent_store is not None:
+            for i, (num_sample, noise_seed, image_num) in enumerate(params):
+                for distance in MANIPULATE_DISTANCES:
+                    code = self.latent_store.get(num_sample, noise_seed, distance, image_num)
+                    if code is not None:
+                        codes[distance][i] = np.array(code)
+
+        missing = [i for i in range(len(params)) if any(codes[d][i] is None for d in MANIPULATE_DISTANCES)]
+        if missing:
+            # 요청된 샘플의 latent code 만 생성 ([M, L, D])
+            wp_codes = sample_codes_at(self.generator, [params[i] for i in missing], self.w1k_code)
+            for distance in MANIPULATE_DISTANCES:
+                manipulated = self.manipulate_codes(wp_codes, distance)
+                for row, i in enumerate(missing):
+                    codes[distance][i] = manipulated[row]
+                    if self.latent_store is not None:
+                        self.latent_store.put(*params[i][:2], distance, params[i][2], manipulated[row])
+
+        return [np.stack(codes[distance]) for distance in MANIPULATE_DISTANCES]
+
+    def compute_aggregate_grad_cams(self, latent_codes):
+        """레이어 6~11 의 ΔGrad-CAM 을 누적한 heatmap([B, H, W])을 계산합니다."""
+        negative_codes, positive_codes = [latent_code[:, STEP_INDEX] for latent_code in latent_codes]
+        return self.grad_cam_engine.aggregate(negative_codes, positive_codes)
+
+    def batch_chunk_size(self):
+        """사용 가능한 메모리를 기준으로 한 번에 Grad-CAM 을 계산할 샘플 수를 정합니다."""
+        import torch
+
+        if os.getenv('HIGAN_BATCH_CHUNK'):
+            return max(1, int(os.getenv('HIGAN_BATCH_CHUNK')))
+        if self.device.type == 'cuda':
+            available, _ = torch.cuda.mem_get_info(self.device)
+        else:
+            import psutil
+            available = psutil.virtual_memory().available
+        # 샘플 하나(조작 전/후 2개 코드)의 layer 11 까지 activation 을 보수적으로 추정한 값
+        return int(min(MAX_BATCH_CHUNK, max(1, available * 0.25 // BYTES_PER_BATCH_ITEM)))
+
+    def upload_debug_overlays(self, image_names, latent_codes, heatmaps, geometries):
+        """조작 후 이미지 위에 heatmap 과 추천 위치를 그린 PNG 를 업로드하고 URL 목록을 반환합니다."""
+        from debug_overlay import render_debug_overlay
+
+        # 조작 후 이미지를 배치로 한 번만 생성 ([B, H, W, 3] RGB uint8)
+        with self._lock:
+            images = self.generator.easy_synthesize(latent_codes[:, STEP_INDEX], latent_space_type='wp')['image']
+
+        jobs = [
+            UploadJob(mask_key(image_name, 'debug_overlay.png'),
+                      data=encode_png(render_debug_overlay(image, heatmap, item_geometries)))
+            for image_name, image, heatmap, item_geometries in zip(image_names, images, heatmaps, geometries)
+        ]
+        report = self.uploader.upload_many(jobs)
+        return [report["urls"].get(job.key) for job in jobs]
+
+    def render_and_upload_masks(self, image_name, heatmap, geometries):
+        """클러스터별 타원 마스크를 메모리에서 PNG 로 만들어 S3 에 업로드합니다.
+
+        (mask_images, 업로드한 {파일 이름: PNG bytes}) 를 반환합니다.
+        """
+        import cv2
+
+        try:
+            masks = rasterize_ellipses(geometries, heatmap.shape)
+        except cv2.error as e:
+            print(f"Failed to create mask image: {e}")
+            return [], {}
+
+        pngs = {}
+        for i, (geometry, mask) in enumerate(zip(geometries, masks)):
+            mask_filename = f"mask_cluster_{i + 1}.png"
+            cluster_center = geometry["center"]
+            print(f"cluster_{i + 1} Center Coordinates: (y: {cluster_center[0]:.2f}, x: {cluster_center[1]:.2f})")
+            try:
+                pngs[mask_filename] = encode_png(mask)
+            except cv2.error as e:
+                print(f"Failed to create mask image: {e}")
+
+        # 마스크를 동시에 업로드
+        report = self.uploader.upload_many([
+            UploadJob(mask_key(image_name, mask_filename), data=png) for mask_filename, png in pngs.items()
+        ])
+
+        mask_images, uploaded = [], {}
+        for i, geometry in enumerate(geometries):
+            mask_filename = f"mask_cluster_{i + 1}.png"
+            mask_url = report["urls"].get(mask_key(image_name, mask_filename))
+            if mask_url is None:
+                continue
+            print(f"Uploaded {mask_filename} to {mask_url}")
+            uploaded[mask_filename] = pngs[mask_filename]
+            mask_images.append({f"mask_img_{i + 1}": mask_url, **cluster_metadata(geometry)})
+
+        return mask_images, uploaded
+
+    def analyze(self, params):
+        """(num_sample, noise_seed, image_num) 목록에 대해 heatmap 과 추천 클러스터 geometry 를 계산합니다.
+
+        sampling, manipulation, Grad-CAM 은 목록 전체를 하나의 배치로 처리하며, 이 구간만 모델 lock 을 잡습니다.
+        (조작 후 latent code [B, Steps, L, D], heatmaps, geometries) 를 반환합니다.
+        """
+        with self._lock:
+            latent_codes1, latent_codes2 = self.manipulated_codes(params)
+            aggregate_grad_cams = self.compute_aggregate_grad_cams([latent_codes1, latent_codes2])
+
+        heatmaps, geometries = [], []
+        for aggregate_grad_cam in aggregate_grad_cams:
+            # Aggregate ΔGrad-CAM 계산 및 클러스터링
+            heatmap = aggregate_grad_cam / aggregate_grad_cam.max()
+            clusters = cluster_heatmap(
+                heatmap, method=self.cluster_method, cluster_resolution=self.cluster_resolution, **CLUSTER_PARAMS)
+
+            # 클러스터를 높은 Heat 비중으로 정렬
+            cluster_scores = {
+                cluster_id: np.mean(cluster_values) for cluster_id, (_, cluster_values) in clusters.items()
+            }
+            sorted_clusters = sorted(cluster_scores.items(), key=lambda x: x[1], reverse=True)[:MAX_RECOMMEND]
+
+            # 클러스터 중심/타원 크기는 한 번만 계산해 마스크와 디버그 오버레이에 함께 사용
+            heatmaps.append(heatmap)
+            geometries.append(cluster_geometry(clusters, sorted_clusters))
+
+        return latent_codes2, heatmaps, geometries
+
+    def recommend(self, items, debug=False):
+        """(image_name, num_sample, noise_seed, image_num) 목록에 대해 추천 위치 마스크를 만들어 업로드합니다.
+
+        debug 이면 heatmap 오버레이 PNG 도 업로드해 debug_overlay 로 반환합니다.
+        모든 마스크가 업로드된 결과는 결과 캐시에 저장합니다.
+        """
+        image_names = [item[0] for item in items]
+        params = [item[1:] for item in items]
+        latent_codes2, heatmaps, geometries = self.analyze(params)
+
+        results = []
+        for image_name, item_params, heatmap, item_geometries in zip(image_names, params, heatmaps, geometries):
+            mask_images, pngs = self.render_and_upload_masks(image_name, heatmap, item_geometries)
+            if len(pngs) == len(item_geometries):
+                self.store_result(image_name, item_params, mask_images, pngs)
+            results.append({"mask_images": mask_images})
+
+        if debug:
+            overlay_urls = self.upload_debug_overlays(image_names, latent_codes2, heatmaps, geometries)
+            for result, url in zip(results, overlay_urls):
+                result["debug_overlay"] = url
+
+        return results
+
+    def save_mask_images(self, document, mask_images):
+        """추천 결과를 이미지 문서에 기록합니다."""
+        from pymongo.errors import PyMongoError
+
+        if not mask_images:
+            return
+        try:
+            result = self.collection.update_one(
+                {"_id": document["_id"]},
+                {"$set": {
+                    "mask_images": mask_images,
+                    "uploaded_at": datetime.now(timezone.utc)
+                }}
+            )
+            if result.modified_count > 0:
+                print(f"MongoDB updated successfully with {len(mask_images)} mask images.")
+            else:
+                print("MongoDB update failed. No document was modified.")
+        except PyMongoError as e:
+            print(f"Failed to update MongoDB: {e}")
+
+    def find_document(self, image_id=None, image_name=None, image_url=None):
+        """요청에 지정된 이미지 문서를 한 번의 조회로 가져옵니다.
+
+        image_id(ObjectId 문자열), image_name, image_url(s3_url) 순서로 사용하며,
+        아무것도 지정하지 않으면 가장 최근에 업로드된 문서를 사용합니다.
+        """
+        from bson import ObjectId
+        from bson.errors import InvalidId
+
+        if image_id:
+            try:
+                query = {"_id": ObjectId(image_id)}
+            except (InvalidId, TypeError) as e:
+                raise ValueError(f"Invalid image_id: {image_id}") from e
+        elif image_name:
+            query = {"image_name": image_name}
+        elif image_url:
+            query = {"s3_url": image_url}
+        else:
+            print("Debug: Fetching the most recent document...")
+            document = self.collection.find_one({}, DOCUMENT_PROJECTION, sort=[("uploaded_at", -1)])
+            if not document:
+                raise LookupError("No documents found in the 'images' collection.")
+            return document
+
+        document = self.collection.find_one(query, DOCUMENT_PROJECTION)
+        if not document:
+            raise LookupError(f"No image document matches {query}")
+        return document
+
+    def run(self, image_id=None, image_name=None, image_url=None, debug=False, progress=None):
+        """지정한 이미지 문서(없으면 가장 최근 문서)에 대해 추천을 실행하고 MongoDB 에 결과를 기록합니다.
+
+        결과 캐시에 있으면 모델을 로드하지 않고 캐시된 결과를 사용합니다 (debug 요청 제외).
+        progress 가 주어지면 단계가 바뀔 때마다 단계 이름으로 호출합니다.
+        """
+        progress = progress or (lambda stage: None)
+        progress('lookup')
+        self.load_clients()
+        document = self.find_document(image_id=image_id, image_name=image_name, image_url=image_url)
+
+        image_name = document.get("image_name", "")
+        num_sample, noise_seed, image_num = parse_image_name(image_name)
+        print(f"Parsed values - num_sample: {num_sample}, noise_seed: {noise_seed}, image_num: {image_num}")
+
+        result = None if debug else self.cached_result(image_name, (num_sample, noise_seed, image_num))
+        if result is None:
+            progress('loading')
+            self.load()
+            progress('recommending')
+            result = self.recommend([(image_name, num_sample, noise_seed, image_num)], debug=debug)[0]
+
+        progress('saving')
+        self.save_mask_images(document, result["mask_images"])
+
+        return {"image_name": image_name, **result}
+
+    def run_batch(self, requests, debug=False):
+        """여러 이미지에 대해 추천을 실행합니다.
+
+        requests 의 각 항목은 이미지 이름 문자열, {"image_name": ...} 또는
+        {"num_sample", "noise_seed", "image_num"} 입니다. 이미지 이름으로 요청된 항목은
+        해당 MongoDB 문서에도 결과를 기록합니다. 항목별 결과(또는 error)를 요청 순서대로 반환합니다.
+        결과 캐시에 있는 항목은 바로 반환하고, 나머지가 있을 때만 모델을 로드합니다.
+        """
+        self.load_clients()
+
+        requests = [{"image_name": request} if isinstance(request, str) else request for request in requests]
+
+        # 이미지 이름으로 요청된 문서를 한 번의 조회로 가져옵니다.
+        image_names = [request["image_name"] for request in requests
+                       if isinstance(request, dict) and isinstance(request.get("image_name"), str)]
+        documents_by_name = {}
+        if image_names:
+            for document in self.collection.find({"image_name": {"$in": image_names}}, DOCUMENT_PROJECTION):
+                documents_by_name.setdefault(document["image_name"], document)
+
+        results = [None] * len(requests)
+        items, documents, positions = [], [], []
+        for position, request in enumerate(requests):
+            try:
+                if request.get("image_name"):
+                    image_name = request["image_name"]
+                    params = parse_image_name(image_name)
+                    document = documents_by_name.get(image_name)
+                else:
+                    params = tuple(int(request[key]) for key in ("num_sample", "noise_seed", "image_num"))
+                    image_name = "_".join(map(str, params))
+                    document = None
+                if not 0 <= params[2] < params[0]:
+                    raise ValueError(f"image_num ({params[2]}) is out of bounds for num_sample {params[0]}")
+                cached = None if debug else self.cached_result(image_name, params)
+                if cached is not None:
+                    if document is not None:
+                        self.save_mask_images(document, cached["mask_images"])
+                    results[position] = {"image_name": image_name, **cached}
+                    continue
+                items.append((image_name,) + tuple(params))
+                documents.append(document)
+                positions.append(position)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                results[position] = {"error": f"Invalid request: {e}"}
+
+        if not items:
+            return results
+
+        self.load()
+        chunk_size = self.batch_chunk_size()
+        print(f"Batch recommendation: {len(items)} images, chunk size {chunk_size}")
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            try:
+                chunk_results = self.recommend(chunk, debug=debug)
+            except Exception as e:
+                # 한 chunk 의 실패(모델 오류, OOM, 업로드 오류 등)가 배치 전체를 실패시키지 않도록 항목별 error 로 기록
+                print(f"Batch chunk failed ({len(chunk)} images): {e}")
+                for offset in range(len(chunk)):
+                    results[positions[start + offset]] = {"image_name": chunk[offset][0], "error": str(e)}
+                continue
+
+            for offset, result in enumerate(chunk_results):
+                document = documents[start + offset]
+                if document is not None:
+                    self.save_mask_images(document, result["mask_images"])
+                results[positions[start + offset]] = {"image_name": chunk[offset][0], **result}
+
+        return results
@@ -0,0 +1,110 @@
+"""URL 이미지 가져오기 (keep-alive 세션 + 디코딩된 배열 LRU 캐시)
+
+- 하나의 requests.Session 으로 커넥션을 재사용하고, 모든 요청에 timeout 을 둡니다.
+- fetch_many 는 여러 이미지를 동시에 가져옵니다.
+- 디코딩하고 크기까지 맞춘 배열을 (URL, 흑백 여부, 크기) 로 캐시하며 ETag 를 함께 기록합니다.
+  revalidate_after 초가 지나면 If-None-Match 로 확인하고, 304 면 다운로드/디코딩 없이 재사용합니다.
+- 캐시는 배열 byte 합계로 제한하고, 넘으면 가장 오래 쓰지 않은 항목부터 버립니다.
+
+캐시된 배열은 여러 요청이 공유하므로 읽기 전용으로 반환합니다.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_SIZE = (512, 512)  # (height, width)
+DEFAULT_TIMEOUT = (3.05, 20)  # (connect, read) 초
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_REVALIDATE_AFTER = 60.0  # 초
+
+
+class ImageFetcher:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_TIMEOUT, revalidate_after=DEFAULT_REVALIDATE_AFTER,
+                 pool_size=16, max_workers=6):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504)))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-fetch')
+        self._cache = OrderedDict()  # key -> {"etag", "array", "checked_at"}
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _put_cached(self, key, entry):
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= previous["array"].nbytes
+            if entry["array"].nbytes > self.max_bytes:
+                return
+            self._cache[key] = entry
+            self._cache_bytes += entry["array"].nbytes
+            while self._cache_bytes > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted["array"].nbytes
+
+    def fetch(self, url, grayscale=False, size=DEFAULT_SIZE):
+        """URL 의 이미지를 디코딩해 반환합니다. size 가 주어지면 (height, width) 로 맞춥니다."""
+        import cv2
+
+        key = (url, grayscale, tuple(size) if size else None)
+        entry = self._get_cached(key)
+        now = time.monotonic()
+        if entry is not None and now - entry["checked_at"] < self.revalidate_after:
+            self.hits += 1
+            return entry["array"]
+
+        headers = {'If-None-Match': entry["etag"]} if entry is not None else {}
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if entry is not None and response.status_code == 304:
+            # 내용이 바뀌지 않음: 다운로드/디코딩 없이 재사용
+            self.hits += 1
+            self._put_cached(key, {**entry, "checked_at": now})
+            return entry["array"]
+        response.raise_for_status()
+        self.misses += 1
+
+        image_array = np.frombuffer(response.content, dtype=np.uint8)
+        image = cv2.imdecode(image_array, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Failed to decode image from {url}")
+        if size and image.shape[:2] != tuple(size):
+            image = cv2.resize(image, (size[1], size[0]))
+        image.flags.writeable = False
+
+        # ETag 가 있는 응답만 캐시 (S3 객체는 항상 ETag 를 반환)
+        etag = response.headers.get('ETag')
+        if etag:
+            self._put_cached(key, {"etag": etag, "array": image, "checked_at": now})
+        return image
+
+    def fetch_many(self, requests):
+        """[(url, grayscale, size)] 를 동시에 가져와 같은 순서의 배열 목록을 반환합니다."""
+        futures = [self._executor.submit(self.fetch, *request) for request in requests]
+        return [future.result() for future in futures]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "bytes": self._cache_bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,129 @@
+"""깊이가 제한된 작업 큐 (admission control)
+
+ThreadPoolExecutor 의 큐는 무제한이라 요청이 몰리면 작업이 끝없이 쌓이고, 클라이언트는 언제 시작될지
+모르는 작업을 기다리게 됩니다. BoundedJobQueue 는
+
+- 대기 작업이 max_queue 개이면 submit 에서 QueueFull(retry_after) 을 던지고 (API 는 429 + Retry-After),
+- 작업별 실행 시간을 지수 이동 평균(service_time)으로 측정해
+- 대기 순서(position)와 예상 시작까지 남은 시간(eta)을 알려 줍니다.
+
+worker 수는 default_workers 로 CPU 코어 수와 메모리에서 정합니다.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+SERVICE_TIME_ALPHA = 0.2  # 실행 시간 이동 평균 가중치
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def total_memory_bytes():
+    """물리 메모리 크기 (알 수 없으면 None)"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers(memory_per_worker, max_workers, min_workers=1):
+    """코어 수와 (물리 메모리 / 작업당 메모리) 중 작은 값을 [min_workers, max_workers] 로 제한합니다."""
+    workers = available_cpus()
+    memory = total_memory_bytes()
+    if memory:
+        workers = min(workers, memory // memory_per_worker)
+    return int(max(min_workers, min(workers, max_workers)))
+
+
+class BoundedJobQueue:
+    def __init__(self, max_workers, max_queue, initial_service_time=30.0, name='jobs'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.service_time = initial_service_time  # 초, 측정값으로 갱신
+        self._queue = OrderedDict()  # job_id -> (fn, args, kwargs)
+        self._running = {}  # job_id -> 시작 시각
+        self._condition = threading.Condition()
+        self.completed = 0
+        self.rejected = 0
+        self._workers = [threading.Thread(target=self._loop, name=f"{name}-{i}", daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _retry_after(self):
+        # 대기 중인 작업이 모두 worker 에 나눠 처리되는 시간
+        return max(1, math.ceil(len(self._queue) * self.service_time / self.max_workers))
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """작업을 큐에 넣습니다. 큐가 가득 차 있으면 QueueFull 을 던집니다."""
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(self._retry_after())
+            self._queue[job_id] = (fn, args, kwargs)
+            self._condition.notify()
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                job_id, (fn, args, kwargs) = self._queue.popitem(last=False)
+                started = time.monotonic()
+                self._running[job_id] = started
+
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Unexpected job error ({job_id}): {e}")
+            finally:
+                elapsed = time.monotonic() - started
+                with self._condition:
+                    del self._running[job_id]
+                    self.completed += 1
+                    self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+
+    def status(self, job_id):
+        """대기 중인 작업의 {"queue_position": 1부터, "estimated_start_seconds"} (대기 중이 아니면 None)"""
+        with self._condition:
+            if job_id not in self._queue:
+                return None
+            ahead = list(self._queue).index(job_id)
+            now = time.monotonic()
+            # 실행 중인 작업의 남은 시간 + 앞선 대기 작업 시간을 worker 수로 나눔
+            busy = sum(max(0.0, self.service_time - (now - started)) for started in self._running.values())
+            idle_workers = self.max_workers - len(self._running)
+            if ahead < idle_workers:
+                eta = 0.0
+            else:
+                eta = (busy + ahead * self.service_time) / self.max_workers
+            return {"queue_position": ahead + 1, "estimated_start_seconds": round(eta, 1)}
+
+    def stats(self):
+        with self._condition:
+            return {"workers": self.max_workers, "queued": len(self._queue), "running": len(self._running),
+                    "max_queue": self.max_queue, "service_time": round(self.service_time, 2),
+                    "completed": self.completed, "rejected": self.rejected}
+
+
+def create_job_queue(prefix, memory_per_worker, max_workers, min_workers=1, default_queue_depth=16,
+                     initial_service_time=30.0):
+    """환경 변수 `<prefix>_WORKERS` (기본: default_workers), `<prefix>_QUEUE_DEPTH` 로 큐를 만듭니다."""
+    workers = os.getenv(f'{prefix}_WORKERS')
+    workers = int(workers) if workers else default_workers(memory_per_worker, max_workers, min_workers)
+    depth = int(os.getenv(f'{prefix}_QUEUE_DEPTH', str(default_queue_depth)))
+    print(f"{prefix} job queue: {workers} workers, queue depth {depth}")
+    return BoundedJobQueue(workers, depth, initial_service_time, name=prefix.lower())
@@ -0,0 +1,105 @@
+"""조작된 latent code 를 memory-mapped 배열로 보관하는 저장소
+
+(num_sample, noise_seed, distance) 마다 `[num_sample, Steps, L, D]` 크기의 .npy 파일 하나를 두고,
+요청된 샘플 행만 채워 넣습니다. 아직 계산되지 않은 행은 NaN 으로 남아 있으며,
+여러 워커 프로세스가 같은 파일을 mmap 으로 열어 page cache 를 공유합니다.
+파일은 `<root>/<version>/` 아래에 두므로 generator 가중치나 boundary 가 바뀌면 새 디렉터리를 사용합니다.
+"""
+import os
+import threading
+import uuid
+
+import numpy as np
+
+
+class LatentStore:
+    def __init__(self, root, version=None):
+        self.root = os.path.join(root, version) if version else root
+        os.makedirs(self.root, exist_ok=True)
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def _path(self, num_sample, noise_seed, distance):
+        return os.path.join(self.root, f"{num_sample}_{noise_seed}_{float(distance):+.2f}.npy")
+
+    def _open(self, num_sample, noise_seed, distance, row_shape=None, dtype=None):
+        """저장소 파일을 mmap 으로 엽니다. row_shape 가 주어지면 없을 때 새로 만듭니다."""
+        key = (num_sample, noise_seed, float(distance))
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is not None:
+                return array
+
+            path = self._path(num_sample, noise_seed, distance)
+            if not os.path.exists(path):
+                if row_shape is None:
+                    return None
+                # 임시 파일을 NaN 으로 채운 뒤 link 로 생성 (이미 있으면 다른 워커가 만든 파일 사용)
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                array = np.lib.format.open_memmap(
+                    tmp_path, mode='w+', dtype=dtype, shape=(num_sample,) + tuple(row_shape))
+                array[:] = np.nan
+                array.flush()
+                del array
+                try:
+                    os.link(tmp_path, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.remove(tmp_path)
+
+            array = np.load(path, mmap_mode='r+')
+            self._arrays[key] = array
+            return array
+
+    def get(self, num_sample, noise_seed, distance, sample_index):
+        """저장된 샘플 행([Steps, L, D])을 반환합니다. 없으면 None 을 반환합니다."""
+        array = self._open(num_sample, noise_seed, distance)
+        if array is None:
+            return None
+        row = array[sample_index]
+        if np.isnan(row.flat[0]):
+            return None
+        return row
+
+    def put(self, num_sample, noise_seed, distance, sample_index, row):
+        """샘플 행을 기록합니다.
+
+        get 은 첫 원소가 NaN 이 아니면 행 전체가 기록된 것으로 보므로, 첫 원소를 NaN 으로 둔 채
+        나머지를 쓰고 flush 한 뒤 마지막에 첫 원소를 씁니다.
+        """
+        row = np.asarray(row)
+        array = self._open(num_sample, noise_seed, distance, row_shape=row.shape, dtype=row.dtype)
+        target = array[sample_index]
+        target.flat[0] = np.nan
+        target.flat[1:] = row.flat[1:]
+        array.flush()
+        target.flat[0] = row.flat[0]
+        array.flush()
+
+
+def round_trip_check(version='check', row_shape=(2, 14, 512)):
+    """임시 디렉터리의 버전별 저장소에 행을 기록하고 같은 값이 읽히는지 확인합니다."""
+    import shutil
+    import tempfile
+
+    root = tempfile.mkdtemp()
+    try:
+        store = LatentStore(root, version)
+        row = np.random.RandomState(0).randn(*row_shape).astype(np.float32)
+        assert store.get(4, 7, 3, 1) is None, "기록 전인데 값이 있습니다."
+        store.put(4, 7, 3, 1, row)
+        assert store.get(4, 7, 3, 0) is None, "기록하지 않은 행이 채워져 있습니다."
+        assert np.array_equal(store.get(4, 7, 3, 1), row), "기록한 행과 읽은 행이 다릅니다."
+
+        # 다른 프로세스처럼 새 인스턴스로 열어도 같은 값이 보여야 합니다.
+        reopened = LatentStore(root, version)
+        assert np.array_equal(reopened.get(4, 7, 3, 1), row), "다시 연 저장소에서 행을 읽지 못했습니다."
+        assert os.path.isfile(store._path(4, 7, 3)) and store._path(4, 7, 3).startswith(os.path.join(root, version))
+        print(f"LatentStore round trip OK ({store.root})")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    round_trip_check()
@@ -0,0 +1,211 @@
+"""조명 합성 결과에서 조명 영역 마스크 추출
+
+기존 /generate_mask 는 skimage `compare_ssim(full=True)` 를 float64 로 전체 해상도에서 계산한 뒤
+Otsu 이진화, floodFill 구멍 채우기, 밝기 threshold, 51x51 GaussianBlur 를 차례로 수행했습니다.
+`extract_mask` 는 같은 순서를 따르되 다음을 바꿉니다.
+
+- SSIM map: OpenCV 의 separable box(또는 gaussian) filter 로 float32 평균/분산/공분산을 한 번에 계산
+  (skimage 기본값과 같은 7x7 window, sample covariance, reflect border)
+- scale < 1 이면 SSIM 을 축소 해상도에서 계산한 뒤 원래 크기로 보간
+- 큰 blur 는 blur_factor 배 축소한 이미지에 같은 sigma 비율로 적용한 뒤 다시 확대
+
+`reference_mask` 는 기존 파이프라인 그대로이며, `compare_pipelines` / `benchmark` 로 속도와 픽셀 일치도를 비교합니다.
+"""
+import time
+
+import numpy as np
+
+WIN_SIZE = 7  # skimage structural_similarity 기본 window
+K1, K2 = 0.01, 0.03
+BRIGHT_THRESHOLD = 200
+BLUR_KSIZE = 51
+
+
+def _box(image, ksize):
+    import cv2
+
+    return cv2.boxFilter(image, cv2.CV_32F, (ksize, ksize), normalize=True, borderType=cv2.BORDER_REFLECT)
+
+
+def _gaussian(image, ksize, sigma=1.5):
+    import cv2
+
+    return cv2.GaussianBlur(image, (ksize, ksize), sigma, borderType=cv2.BORDER_REFLECT)
+
+
+def ssim_map(grayA, grayB, win_size=WIN_SIZE, gaussian_weights=False, scale=1.0):
+    """uint8 흑백 이미지 두 장의 SSIM map (float32, 입력과 같은 크기)
+
+    skimage 의 structural_similarity(grayA, grayB, full=True)[1] 과 같은 정의입니다 (data_range=255).
+    gaussian_weights=True 이면 sigma=1.5, 11x11 gaussian window 를 사용합니다.
+    두 경우 모두 skimage 기본값(use_sample_covariance=True)처럼 분산/공분산에 N / (N - 1) 을 곱합니다.
+    """
+    import cv2
+
+    height, width = grayA.shape[:2]
+    a = grayA.astype(np.float32) * (1 / 255.0)
+    b = grayB.astype(np.float32) * (1 / 255.0)
+    if scale < 1.0:
+        size = (max(win_size, int(round(width * scale))), max(win_size, int(round(height * scale))))
+        a = cv2.resize(a, size, interpolation=cv2.INTER_AREA)
+        b = cv2.resize(b, size, interpolation=cv2.INTER_AREA)
+
+    if gaussian_weights:
+        win_size = 11
+        smooth = lambda image: _gaussian(image, win_size)
+    else:
+        smooth = lambda image: _box(image, win_size)
+    num_points = win_size ** 2
+    cov_norm = num_points / (num_points - 1)  # sample covariance
+
+    ux, uy = smooth(a), smooth(b)
+    uxx, uyy, uxy = smooth(a * a), smooth(b * b), smooth(a * b)
+    vx = cov_norm * (uxx - ux * ux)
+    vy = cov_norm * (uyy - uy * uy)
+    vxy = cov_norm * (uxy - ux * uy)
+
+    # data_range 를 1 로 정규화했으므로 C1, C2 도 [0, 1] 기준
+    c1, c2 = K1 ** 2, K2 ** 2
+    numerator = (2 * ux * uy + c1) * (2 * vxy + c2)
+    denominator = (ux * ux + uy * uy + c1) * (vx + vy + c2)
+    ssim = numerator / denominator
+
+    if ssim.shape[:2] != (height, width):
+        ssim = cv2.resize(ssim, (width, height), interpolation=cv2.INTER_LINEAR)
+    return ssim
+
+
+def fast_blur(mask, ksize=BLUR_KSIZE, blur_factor=4):
+    """GaussianBlur(mask, (ksize, ksize), 0) 근사: blur_factor 배 축소 -> 작은 kernel blur -> 확대"""
+    import cv2
+
+    if blur_factor <= 1:
+        return cv2.GaussianBlur(mask, (ksize, ksize), 0)
+
+    height, width = mask.shape[:2]
+    sigma = 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8  # ksize 로부터 OpenCV 가 정하는 sigma
+    small = cv2.resize(mask, (max(1, width // blur_factor), max(1, height // blur_factor)),
+                       interpolation=cv2.INTER_AREA).astype(np.float32)
+    small_sigma = sigma / blur_factor
+    small_ksize = 2 * int(np.ceil(3 * small_sigma)) + 1
+    small = cv2.GaussianBlur(small, (small_ksize, small_ksize), small_sigma)
+    blurred = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    return np.clip(blurred + 0.5, 0, 255).astype(np.uint8)
+
+
+def _fill_and_select(diff, grayA):
+    """SSIM uint8 map -> Otsu -> 구멍 채우기 -> 밝은 영역과 교집합 (기존과 같은 순서)"""
+    import cv2
+
+    _, thresh = cv2.threshold(diff, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+    flood_filled = thresh.copy()
+    h, w = flood_filled.shape[:2]
+    cv2.floodFill(flood_filled, np.zeros((h + 2, w + 2), dtype=np.uint8), (0, 0), 255)
+    combined_filled = cv2.bitwise_or(thresh, cv2.bitwise_not(flood_filled))
+
+    _, bright_mask = cv2.threshold(grayA, BRIGHT_THRESHOLD, 255, cv2.THRESH_BINARY)
+    return cv2.bitwise_and(combined_filled, bright_mask)
+
+
+def _to_gray(imageA, imageB):
+    import cv2
+
+    if imageA.shape[:2] != imageB.shape[:2]:
+        imageB = cv2.resize(imageB, (imageA.shape[1], imageA.shape[0]))
+    return cv2.cvtColor(imageA, cv2.COLOR_BGR2GRAY), cv2.cvtColor(imageB, cv2.COLOR_BGR2GRAY)
+
+
+def extract_mask(imageA, imageB, scale=1.0, blur_factor=4, gaussian_weights=False, return_binary=False):
+    """합성 결과(imageA)와 원본(imageB) BGR 이미지로 blur 된 조명 마스크(uint8)를 만듭니다.
+
+    return_binary=True 이면 (blur 된 마스크, blur 전 이진 마스크) 를 반환합니다.
+    """
+    grayA, grayB = _to_gray(imageA, imageB)
+    ssim = ssim_map(grayA, grayB, gaussian_weights=gaussian_weights, scale=scale)
+    # 기존 `(diff * 255).astype("uint8")` 과 같은 값 (음수 SSIM 은 기존처럼 256 으로 나눈 나머지)
+    diff = (ssim * 255).astype(np.int32).astype(np.uint8)
+    common_mask = _fill_and_select(diff, grayA)
+    blurred_mask = fast_blur(common_mask, BLUR_KSIZE, blur_factor)
+    return (blurred_mask, common_mask) if return_binary else blurred_mask
+
+
+def reference_mask(imageA, imageB, return_binary=False):
+    """기존 background_generate_mask 의 파이프라인 (skimage float64 SSIM + 51x51 GaussianBlur)
+
+    음수 SSIM 의 uint8 변환만 플랫폼에 상관없이 같도록 int32 를 거칩니다.
+    """
+    import cv2
+    from skimage.metrics import structural_similarity as compare_ssim
+
+    grayA, grayB = _to_gray(imageA, imageB)
+    (score, diff) = compare_ssim(grayA, grayB, full=True)
+    diff = (diff * 255).astype(np.int32).astype(np.uint8)
+    common_mask = _fill_and_select(diff, grayA)
+    blurred_mask = cv2.GaussianBlur(common_mask, (BLUR_KSIZE, BLUR_KSIZE), 0)
+    return (blurred_mask, common_mask) if return_binary else blurred_mask
+
+
+def compare_pipelines(imageA, imageB, repeat=5, **kwargs):
+    """기존 파이프라인과 extract_mask 의 실행 시간과 픽셀 일치도를 비교합니다.
+
+    binary_agreement: blur 전 이진 마스크가 같은 픽셀 비율
+    blur_max_diff / blur_within_2: blur 된 마스크의 최대 차이, 차이가 2 이하인 픽셀 비율
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        expected, expected_binary = reference_mask(imageA, imageB, return_binary=True)
+    reference_time = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        actual, actual_binary = extract_mask(imageA, imageB, return_binary=True, **kwargs)
+    fast_time = (time.perf_counter() - started) / repeat
+
+    blur_diff = np.abs(expected.astype(np.int16) - actual.astype(np.int16))
+    return {
+        "timings": {"reference": reference_time, "fast": fast_time},
+        "binary_agreement": float(np.mean(expected_binary == actual_binary)),
+        "blur_max_diff": int(blur_diff.max()),
+        "blur_within_2": float(np.mean(blur_diff <= 2)),
+    }
+
+
+def synthetic_pair(size=512, num_lights=2, seed=0):
+    """벤치마크용 (합성 결과, 원본) BGR 이미지 쌍: 부드러운 텍스처 원본에 밝은 조명 glow 를 더함"""
+    import cv2
+
+    rng = np.random.RandomState(seed)
+    original = rng.randint(0, 256, (size // 8, size // 8, 3)).astype(np.uint8)
+    original = cv2.resize(original, (size, size), interpolation=cv2.INTER_CUBIC)
+    original = cv2.GaussianBlur(original, (0, 0), 3) // 2 + 40
+
+    y, x = np.mgrid[0:size, 0:size]
+    glow = np.zeros((size, size), dtype=np.float32)
+    for _ in range(num_lights):
+        cy, cx = rng.uniform(0.2, 0.8, 2) * size
+        sigma = rng.uniform(0.04, 0.08) * size
+        glow += 255 * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * sigma ** 2))
+    processed = original.astype(np.float32) + glow[..., None] + rng.normal(0, 2, original.shape)
+    return np.clip(processed, 0, 255).astype(np.uint8), original
+
+
+def benchmark(num_pairs=5, size=512, **kwargs):
+    """합성 이미지 쌍에 대해 두 파이프라인의 속도와 픽셀 일치도를 출력합니다."""
+    results = []
+    for seed in range(num_pairs):
+        report = compare_pipelines(*synthetic_pair(size, seed=seed), **kwargs)
+        timings = report["timings"]
+        results.append(report)
+        print(f"seed {seed}: reference {timings['reference'] * 1000:7.2f}ms  fast {timings['fast'] * 1000:6.2f}ms  "
+              f"x{timings['reference'] / timings['fast']:5.1f}  binary agreement {report['binary_agreement']:.4f}  "
+              f"blur max|diff| {report['blur_max_diff']}  within 2 {report['blur_within_2']:.4f}")
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
+    print("blur_factor=1 (정확한 51x51 GaussianBlur)")
+    benchmark(blur_factor=1)
+    print("scale=0.5")
+    benchmark(scale=0.5)
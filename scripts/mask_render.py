@@ -0,0 +1,65 @@
+"""추천 위치 타원 마스크 생성
+
+클러스터마다 중심/공분산/고유값 분해를 한 번만 계산하고(`cluster_geometry`),
+모든 타원을 하나의 브로드캐스트 연산으로 래스터화한 뒤(`rasterize_ellipses`),
+디스크를 거치지 않고 메모리에서 PNG 로 인코딩합니다(`encode_png`).
+"""
+import numpy as np
+
+SCALING_FACTOR = 3.0
+ELLIPSE_ANGLE = 90.0  # 타원의 각도를 항상 수직으로 설정 (90도)
+
+
+def cluster_geometry(clusters, sorted_clusters, scaling_factor=SCALING_FACTOR):
+    """정렬된 클러스터마다 중심, 최고점, 타원 축 길이를 계산합니다."""
+    geometries = []
+    for cluster_id, _ in sorted_clusters:
+        points, values = clusters[cluster_id]
+
+        # 타원 중심과 범위 계산
+        cluster_center = np.mean(points, axis=0)
+        covariance_matrix = np.cov(points, rowvar=False)
+        eigenvalues, _ = np.linalg.eigh(covariance_matrix)
+        geometries.append({
+            "cluster_id": cluster_id,
+            "center": cluster_center,  # (y, x)
+            "top_point": points[np.argmax(values)],  # (y, x)
+            "major_axis": scaling_factor * 2 * np.sqrt(eigenvalues[1]),  # 주축
+            "minor_axis": scaling_factor * 2 * np.sqrt(eigenvalues[0]),  # 부축
+            "angle": ELLIPSE_ANGLE,
+        })
+    return geometries
+
+
+def rasterize_ellipses(geometries, shape):
+    """모든 타원을 한 번에 래스터화해 [K, H, W] uint8 마스크(내부 255)를 반환합니다."""
+    if not geometries:
+        return np.zeros((0,) + tuple(shape), dtype=np.uint8)
+
+    center_y = np.array([g["center"][0] for g in geometries])[:, None, None]
+    center_x = np.array([g["center"][1] for g in geometries])[:, None, None]
+    half_major = np.array([g["major_axis"] / 2 for g in geometries])[:, None, None]
+    half_minor = np.array([g["minor_axis"] / 2 for g in geometries])[:, None, None]
+    radians = np.radians(np.array([g["angle"] for g in geometries]))[:, None, None]
+    cos, sin = np.cos(radians), np.sin(radians)
+
+    y, x = np.ogrid[0:shape[0], 0:shape[1]]
+    dx, dy = x - center_x, y - center_y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inside = (
+            (dx * cos + dy * sin) ** 2 / half_major ** 2 +
+            (dx * sin - dy * cos) ** 2 / half_minor ** 2
+        ) <= 1  # 타원 내부인지 확인
+
+    # 타원 내부를 흰색으로 설정
+    return inside.astype(np.uint8) * 255
+
+
+def encode_png(image):
+    """이미지를 메모리에서 PNG bytes 로 인코딩합니다."""
+    import cv2
+
+    ok, buffer = cv2.imencode('.png', image)
+    if not ok:
+        raise cv2.error("PNG 인코딩에 실패했습니다.")
+    return buffer.tobytes()
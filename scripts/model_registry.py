@@ -0,0 +1,67 @@
+"""프로세스 공용 모델 레지스트리
+
+(model_name, device, dtype) 마다 generator 를 한 번만 만들어 eval 모드로 device 에 올려 두고,
+sampling / synthesis / Grad-CAM hook 이 모두 같은 인스턴스를 공유하도록 합니다.
+"""
+import threading
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _model_key(model_name, device, dtype):
+    return (model_name, str(device), str(dtype))
+
+
+def get_generator(model_name, device, dtype=None):
+    """공유 generator 를 반환합니다. 처음 요청될 때만 빌드 및 가중치 로드를 수행합니다."""
+    import torch
+
+    if dtype is None:
+        dtype = torch.float32
+    key = _model_key(model_name, device, dtype)
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            from models.helper import build_generator
+
+            # build_generator 는 weight_path 에 가중치가 있으면 생성 시점에 로드합니다.
+            model = build_generator(model_name)
+            model.net.to(device=device, dtype=dtype)
+            model.net.eval()
+            if hasattr(model, 'run_device'):
+                model.run_device = str(device)
+            _models[key] = model
+            print(f"모델 로드 완료: {key} ({format_bytes(model_bytes(model))})")
+    return model
+
+
+def model_bytes(model):
+    """모델 파라미터와 버퍼가 차지하는 메모리(byte)를 계산합니다."""
+    tensors = list(model.net.parameters()) + list(model.net.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def resident_models():
+    """로드된 모델별 메모리 사용량을 {key: bytes} 로 반환합니다."""
+    with _lock:
+        return {key: model_bytes(model) for key, model in _models.items()}
+
+
+def resident_bytes():
+    """로드된 모든 모델이 차지하는 메모리의 합(byte)입니다."""
+    return sum(resident_models().values())
+
+
+def clear():
+    """로드된 모델을 모두 해제합니다."""
+    with _lock:
+        _models.clear()
+
+
+def format_bytes(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
@@ -0,0 +1,68 @@
+"""갤러리 이미지 추천 결과 사전 계산 (오프라인 배치 작업)
+
+manifest 의 (num_sample, noise_seed, image_num) 마다 aggregate heatmap, 클러스터 중심, 마스크 PNG 를
+계산해 sqlite 인덱스 파일 하나에 기록합니다. 서버는 HIGAN_GALLERY_INDEX 로 이 파일을 지정하면
+카탈로그 이미지 요청을 GAN forward/backward 없이 조회만으로 처리합니다.
+
+    python scripts/precompute-gallery.py gallery.txt --index higan_gallery.sqlite
+
+이미 인덱스에 있는 항목은 건너뛰므로 중단된 작업을 같은 명령으로 이어서 실행할 수 있습니다.
+모델 버전(가중치/boundary/설정)이 바뀌면 새 버전으로 다시 계산합니다.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gallery_index import GalleryIndex, read_manifest
+from higan_engine import HiganEngine, cluster_metadata
+from mask_render import encode_png, rasterize_ellipses
+from startup_timer import StartupTimer
+
+
+def precompute(engine, index, triples, chunk_size):
+    version = engine.result_version()
+    done = index.contains(version, triples)
+    pending = [triple for triple in triples if triple not in done]
+    print(f"Gallery: {len(triples)} images, {len(done)} already indexed, {len(pending)} to compute "
+          f"(version {version}, chunk size {chunk_size})")
+
+    started = time.perf_counter()
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        _, heatmaps, geometries = engine.analyze(chunk)
+
+        entries = []
+        for triple, heatmap, item_geometries in zip(chunk, heatmaps, geometries):
+            masks = rasterize_ellipses(item_geometries, heatmap.shape)
+            entries.append((
+                triple, heatmap,
+                [cluster_metadata(geometry) for geometry in item_geometries],
+                [encode_png(mask) for mask in masks],
+            ))
+        index.put_many(version, entries)
+
+        completed = start + len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"  {completed}/{len(pending)} images ({completed / elapsed:.2f} images/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="갤러리 이미지 추천 결과를 미리 계산해 인덱스 파일에 저장")
+    parser.add_argument('manifest', help="한 줄에 `num_sample,noise_seed,image_num` (또는 `num_sample,noise_seed`)")
+    parser.add_argument('--index', default='higan_gallery.sqlite', help="결과를 기록할 sqlite 파일")
+    parser.add_argument('--chunk-size', type=int, default=None, help="한 번에 계산할 이미지 수 (기본값: 메모리 기준)")
+    args = parser.parse_args()
+
+    timer = StartupTimer('precompute-gallery')
+    engine = HiganEngine()
+    engine.load_models(timer=timer)
+    timer.report()
+
+    index = GalleryIndex(args.index)
+    try:
+        precompute(engine, index, read_manifest(args.manifest), args.chunk_size or engine.batch_chunk_size())
+    finally:
+        index.close()
@@ -0,0 +1,192 @@
+"""HiGAN 추천 결과 캐시
+
+추천 결과는 (num_sample, noise_seed, image_num) 과 모델/boundary/조작 거리/클러스터링 설정에만
+의존하므로, 이 값들로 만든 키로 클러스터 중심과 마스크 PNG 를 저장해 두고 재사용합니다.
+
+- LocalResultCache: `<root>/<key>/meta.json` + `mask_cluster_N.png`. 조회 시 meta.json 의
+  mtime 을 갱신해 LRU 순서를 유지하고, 항목 수/총 byte 한도를 넘으면 오래된 항목부터 지웁니다.
+- S3ResultCache: `<prefix><key>/...` 에 같은 구조로 저장합니다. 조회 시 meta.json 을 자기 자신으로
+  복사해 LastModified 를 갱신하고(LRU), evict_every 번 저장할 때마다 prefix 를 나열해 한도를 넘는
+  항목을 지웁니다 (그 사이에는 한도를 잠시 넘을 수 있음).
+
+항목 형식: {"image_name": str, "mask_images": [...], "masks": {filename: png bytes}}
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+META_FILENAME = 'meta.json'
+
+
+def cache_key(num_sample, noise_seed, image_num, version):
+    return hashlib.sha256(f"{version}:{num_sample}:{noise_seed}:{image_num}".encode()).hexdigest()[:32]
+
+
+def version_hash(*parts):
+    """모델 가중치 해시, boundary 해시, 조작/클러스터링 설정 등을 하나의 버전 문자열로 묶습니다."""
+    return hashlib.sha256(json.dumps([str(part) for part in parts]).encode()).hexdigest()[:16]
+
+
+class LocalResultCache:
+    def __init__(self, root, max_entries=1000, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        # 디스크에 있는 항목을 마지막 사용 시각 순서로 읽어 LRU 인덱스를 만듭니다.
+        entries = []
+        for key in os.listdir(root):
+            meta_path = os.path.join(root, key, META_FILENAME)
+            if os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), key, self._entry_size(key)))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _entry_size(self, key):
+        entry_dir = self._entry_dir(key)
+        return sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._index:
+                return None
+            entry_dir = self._entry_dir(key)
+            try:
+                with open(os.path.join(entry_dir, META_FILENAME)) as f:
+                    entry = json.load(f)
+                entry["masks"] = {}
+                for filename in entry.pop("mask_files"):
+                    with open(os.path.join(entry_dir, filename), 'rb') as f:
+                        entry["masks"][filename] = f.read()
+                os.utime(os.path.join(entry_dir, META_FILENAME))
+            except (OSError, ValueError, KeyError):
+                # 손상된 항목은 지우고 miss 로 처리
+                self._remove(key)
+                return None
+            self._index.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        # 임시 디렉토리에 쓴 뒤 rename 으로 교체
+        tmp_dir = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(tmp_dir)
+        meta = {k: v for k, v in entry.items() if k != "masks"}
+        meta["mask_files"] = list(entry["masks"])
+        for filename, data in entry["masks"].items():
+            with open(os.path.join(tmp_dir, filename), 'wb') as f:
+                f.write(data)
+        with open(os.path.join(tmp_dir, META_FILENAME), 'w') as f:
+            json.dump(meta, f)
+
+        with self._lock:
+            if key in self._index:
+                self._remove(key)
+            os.replace(tmp_dir, self._entry_dir(key))
+            self._index[key] = self._entry_size(key)
+            self._evict()
+
+    def _remove(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self._index.pop(key, None)
+
+    def _evict(self):
+        while self._index and (len(self._index) > self.max_entries or
+                               sum(self._index.values()) > self.max_bytes):
+            oldest = next(iter(self._index))
+            self._remove(oldest)
+
+
+class S3ResultCache:
+    def __init__(self, s3, bucket_name, prefix='higan-cache/', max_entries=10000, max_bytes=5 * 1024 ** 3,
+                 evict_every=50):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = max(1, evict_every)
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _object_key(self, key, filename):
+        return f"{self.prefix}{key}/{filename}"
+
+    def get(self, key):
+        from botocore.exceptions import ClientError
+
+        meta_key = self._object_key(key, META_FILENAME)
+        try:
+            entry = json.loads(self.s3.get_object(Bucket=self.bucket_name, Key=meta_key)['Body'].read())
+            entry["masks"] = {
+                filename: self.s3.get_object(
+                    Bucket=self.bucket_name, Key=self._object_key(key, filename))['Body'].read()
+                for filename in entry.pop("mask_files")
+            }
+            # LastModified 갱신 (LRU)
+            self.s3.copy_object(
+                Bucket=self.bucket_name, Key=meta_key, CopySource={'Bucket': self.bucket_name, 'Key': meta_key},
+                MetadataDirective='REPLACE', ContentType='application/json')
+        except (ClientError, ValueError, KeyError):
+            return None
+        return entry
+
+    def put(self, key, entry):
+        meta = {k: v for k, v in entry.items() if k != "masks"}
+        meta["mask_files"] = list(entry["masks"])
+        for filename, data in entry["masks"].items():
+            self.s3.put_object(Bucket=self.bucket_name, Key=self._object_key(key, filename),
+                               Body=data, ContentType='image/png')
+        # meta.json 을 마지막에 써서 불완전한 항목이 조회되지 않도록 합니다.
+        self.s3.put_object(Bucket=self.bucket_name, Key=self._object_key(key, META_FILENAME),
+                           Body=json.dumps(meta).encode(), ContentType='application/json')
+        # prefix 전체 나열은 비싸므로 evict_every 번 저장할 때마다 한 번만 정리
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self.evict_every == 0
+        if evict:
+            self._evict()
+
+    def _evict(self):
+        entries = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                key, _, filename = obj['Key'][len(self.prefix):].partition('/')
+                entry = entries.setdefault(key, {"size": 0, "objects": [], "last_used": None})
+                entry["size"] += obj['Size']
+                entry["objects"].append(obj['Key'])
+                if filename == META_FILENAME:
+                    entry["last_used"] = obj['LastModified']
+
+        # meta.json 이 없는 항목(쓰는 중)은 제외하고 마지막 사용 시각 순으로 정렬
+        ordered = sorted((e for e in entries.values() if e["last_used"] is not None), key=lambda e: e["last_used"])
+        total_bytes = sum(e["size"] for e in ordered)
+        while ordered and (len(ordered) > self.max_entries or total_bytes > self.max_bytes):
+            oldest = ordered.pop(0)
+            total_bytes -= oldest["size"]
+            for i in range(0, len(oldest["objects"]), 1000):
+                self.s3.delete_objects(Bucket=self.bucket_name, Delete={
+                    'Objects': [{'Key': object_key} for object_key in oldest["objects"][i:i + 1000]]})
+
+
+def create_result_cache(s3=None, bucket_name=None):
+    """환경 변수 HIGAN_RESULT_CACHE ('local' / 's3') 에 따라 캐시를 만듭니다. 설정이 없으면 None 입니다."""
+    backend = os.getenv('HIGAN_RESULT_CACHE', '').lower()
+    max_entries = int(os.getenv('HIGAN_RESULT_CACHE_MAX_ENTRIES', '1000'))
+    max_bytes = int(os.getenv('HIGAN_RESULT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+    if backend == 'local':
+        return LocalResultCache(os.getenv('HIGAN_RESULT_CACHE_DIR', 'higan_cache'), max_entries, max_bytes)
+    if backend == 's3':
+        return S3ResultCache(s3, bucket_name, os.getenv('HIGAN_RESULT_CACHE_PREFIX', 'higan-cache/'),
+                             max_entries, max_bytes, int(os.getenv('HIGAN_RESULT_CACHE_EVICT_EVERY', '50')))
+    if backend:
+        raise ValueError(f"Unknown HIGAN_RESULT_CACHE backend: {backend}")
+    return None
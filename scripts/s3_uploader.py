@@ -0,0 +1,195 @@
+"""두 서비스가 함께 쓰는 S3 업로더
+
+- 프로세스당 boto3 client 하나와 bounded thread pool 하나를 공유합니다.
+- multipart 크기/동시성을 조정한 TransferConfig 를 사용합니다.
+- 파일 경로와 메모리 bytes(upload_fileobj) 모두 업로드할 수 있습니다.
+- 실패하면 지수 backoff(+jitter)로 재시도합니다.
+- upload_many 는 여러 파일을 동시에 올리고 배치별 처리량을 반환합니다.
+
+AWS_S3_ENDPOINT_URL 을 지정하면 MinIO, moto server 같은 로컬 S3 대체 서버에 업로드합니다.
+"""
+import io
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MB = 1024 * 1024
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # 초, 재시도마다 두 배
+
+
+class UploadJob:
+    """업로드할 항목 하나. data(bytes) 또는 path 중 하나를 지정합니다."""
+
+    def __init__(self, key, data=None, path=None, content_type="image/png"):
+        if (data is None) == (path is None):
+            raise ValueError("UploadJob needs exactly one of 'data' or 'path'")
+        self.key = key
+        self.data = data
+        self.path = path
+        self.content_type = content_type
+
+    @property
+    def size(self):
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+
+def create_s3_client(region=None, endpoint_url=None):
+    """환경 변수의 자격 증명으로 S3 client 를 만듭니다. endpoint_url 로 로컬 S3 대체 서버를 쓸 수 있습니다."""
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+        region_name=region or os.getenv('AWS_S3_REGION'),
+        endpoint_url=endpoint_url or os.getenv('AWS_S3_ENDPOINT_URL'),
+        # 업로드 스레드 수만큼 커넥션을 재사용
+        config=Config(max_pool_connections=DEFAULT_MAX_WORKERS * 4),
+    )
+
+
+class S3Uploader:
+    def __init__(self, bucket_name, region=None, s3_client=None, endpoint_url=None,
+                 max_workers=DEFAULT_MAX_WORKERS, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF,
+                 multipart_threshold=8 * MB, multipart_chunksize=8 * MB, max_concurrency=4):
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket_name = bucket_name
+        self.region = region or os.getenv('AWS_S3_REGION')
+        self.endpoint_url = endpoint_url or os.getenv('AWS_S3_ENDPOINT_URL')
+        self.s3 = s3_client or create_s3_client(self.region, self.endpoint_url)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # 파일 하나의 multipart part 동시성 (전체 동시성은 max_workers * max_concurrency 이하)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            use_threads=True,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='s3-upload')
+        self._stats_lock = threading.Lock()
+        self.total_bytes = 0
+        self.total_seconds = 0.0
+
+    def url_for(self, key):
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{key}"
+
+    def _upload_once(self, job):
+        extra_args = {'ContentType': job.content_type}
+        if job.data is not None:
+            self.s3.upload_fileobj(io.BytesIO(job.data), self.bucket_name, job.key,
+                                   ExtraArgs=extra_args, Config=self.transfer_config)
+        else:
+            self.s3.upload_file(job.path, self.bucket_name, job.key,
+                                ExtraArgs=extra_args, Config=self.transfer_config)
+
+    def upload(self, job):
+        """UploadJob 하나를 재시도하며 업로드하고 URL 을 반환합니다. 재시도가 모두 실패하면 마지막 예외를 던집니다."""
+        from boto3.exceptions import S3UploadFailedError
+        from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._upload_once(job)
+                return self.url_for(job.key)
+            except NoCredentialsError:
+                raise
+            except (S3UploadFailedError, ClientError, BotoCoreError, OSError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                print(f"S3 업로드 재시도 ({attempt + 1}/{self.max_retries}) {job.key}: {e} - {delay:.2f}s 후")
+                time.sleep(delay)
+
+    def upload_bytes(self, key, data, content_type="image/png"):
+        return self.upload(UploadJob(key, data=data, content_type=content_type))
+
+    def upload_file(self, path, key, content_type="image/png"):
+        return self.upload(UploadJob(key, path=path, content_type=content_type))
+
+    def upload_many(self, jobs):
+        """여러 UploadJob 을 동시에 업로드합니다.
+
+        반환값: {"urls": {key: url}, "errors": {key: 오류 메시지}, "bytes", "seconds", "throughput"(bytes/s)}
+        """
+        started = time.perf_counter()
+        futures = [(job, self._executor.submit(self.upload, job)) for job in jobs]
+        report = {"urls": {}, "errors": {}, "bytes": 0}
+        for job, future in futures:
+            try:
+                report["urls"][job.key] = future.result()
+                report["bytes"] += job.size
+            except Exception as e:
+                report["errors"][job.key] = str(e)
+                print(f"S3 업로드 실패: {job.key} -> {e}")
+
+        report["seconds"] = time.perf_counter() - started
+        report["throughput"] = report["bytes"] / report["seconds"] if report["seconds"] > 0 else 0.0
+        with self._stats_lock:
+            self.total_bytes += report["bytes"]
+            self.total_seconds += report["seconds"]
+        if jobs:
+            print(f"S3 배치 업로드: {len(report['urls'])}/{len(jobs)}개, {report['bytes'] / MB:.2f}MB, "
+                  f"{report['seconds']:.2f}s ({report['throughput'] / MB:.2f}MB/s)")
+        return report
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def benchmark(num_files=16, file_size=2 * MB, endpoint_url=None, bucket_name='upload-benchmark'):
+    """로컬 S3 대체 서버에 순차 업로드와 upload_many 의 소요 시간을 비교합니다.
+
+    endpoint_url 이 없으면 moto 의 ThreadedMotoServer 를 띄워 사용합니다 (pip install "moto[server]").
+    """
+    server = None
+    if endpoint_url is None:
+        from moto.server import ThreadedMotoServer
+
+        server = ThreadedMotoServer(port=0)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint_url = f"http://{host}:{port}"
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+    try:
+        uploader = S3Uploader(bucket_name, region='us-east-1', endpoint_url=endpoint_url)
+        try:
+            uploader.s3.create_bucket(Bucket=bucket_name)
+        except uploader.s3.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        payloads = [os.urandom(file_size) for _ in range(num_files)]
+        started = time.perf_counter()
+        for i, data in enumerate(payloads):
+            uploader.s3.upload_fileobj(io.BytesIO(data), bucket_name, f"sequential/{i}.bin")
+        sequential = time.perf_counter() - started
+
+        report = uploader.upload_many([
+            UploadJob(f"concurrent/{i}.bin", data=data, content_type="application/octet-stream")
+            for i, data in enumerate(payloads)
+        ])
+        assert not report["errors"], report["errors"]
+        uploaded = uploader.s3.get_object(Bucket=bucket_name, Key="concurrent/0.bin")['Body'].read()
+        assert uploaded == payloads[0], "업로드된 내용이 다릅니다."
+
+        print(f"{num_files} files x {file_size / MB:.1f}MB  sequential {sequential:.2f}s  "
+              f"upload_many {report['seconds']:.2f}s  x{sequential / report['seconds']:.1f}")
+        uploader.shutdown()
+        return sequential, report
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    benchmark()
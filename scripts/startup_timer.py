@@ -0,0 +1,38 @@
+"""서비스 시작 단계별 소요 시간 측정"""
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """`mark()` 또는 `phase()` 로 단계별 시간을 기록하고 `report()` 로 출력합니다."""
+
+    def __init__(self, name):
+        self.name = name
+        self.phases = []
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def mark(self, label):
+        """직전 기록 시점부터 지금까지를 하나의 단계로 기록합니다."""
+        now = time.perf_counter()
+        self.phases.append((label, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def phase(self, label):
+        """with 블록 실행 시간을 하나의 단계로 기록합니다."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases.append((label, now - started))
+            self._last = now
+
+    def report(self):
+        total = time.perf_counter() - self._start
+        width = max([len(label) for label, _ in self.phases] + [5])
+        print(f"\n[{self.name}] 시작 단계별 소요 시간")
+        for label, elapsed in self.phases:
+            print(f"  {label:<{width}}  {elapsed:8.3f}s")
+        print(f"  {'total':<{width}}  {total:8.3f}s\n")
@@ -0,0 +1,94 @@
+"""작업 상태 조회 엔드포인트 (두 Flask 서비스 공통)
+
+- GET /task_status/<task_id>: 현재 상태를 바로 반환합니다 (기존과 같음, version 필드 추가).
+  `?wait=<초>&since=<version>` 을 주면 version 이 since 보다 커지거나 작업이 끝날 때까지,
+  최대 wait 초(LONG_POLL_MAX_WAIT 이하) 기다렸다가 반환합니다 (long-poll).
+- GET /task_events/<task_id>: Server-Sent Events 로 상태가 바뀔 때마다
+  `event: status` (data: 상태 JSON, id: version) 를 보내고, completed/failed 가 되면 스트림을 닫습니다.
+  재연결 시 Last-Event-ID 이후의 변경부터 보냅니다.
+- job_queue 를 주면 대기 중('queued')인 작업에 queue_position, estimated_start_seconds 를 붙여 반환합니다.
+
+두 방식 모두 task store 의 wait (condition variable) 로 기다리며, 대기 중에는 요청 스레드 하나만 사용합니다.
+"""
+import json
+import uuid
+
+from job_queue import QueueFull
+from task_store import FINISHED_STATUSES
+
+LONG_POLL_MAX_WAIT = 30.0  # 초
+SSE_KEEPALIVE = 15.0  # 초, 프록시(ngrok)가 연결을 끊지 않도록 보내는 주석 간격
+
+
+def submit_task(tasks, job_queue, fn, *args):
+    """작업을 만들고 fn(task_id, *args) 를 큐에 넣어 task_id 를 반환합니다.
+
+    큐가 가득 차 있으면 만든 작업을 지우고 QueueFull 을 다시 던집니다.
+    """
+    task_id = str(uuid.uuid4())
+    tasks.create(task_id)
+    try:
+        job_queue.submit(task_id, fn, task_id, *args)
+    except QueueFull:
+        tasks.delete(task_id)
+        raise
+    return task_id
+
+
+def queue_full_response(error):
+    """429 Too Many Requests + Retry-After (측정된 작업 시간 기준)"""
+    from flask import jsonify
+
+    response = jsonify({"error": "Server is busy, please retry later", "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def register_task_routes(app, tasks, job_queue=None, max_wait=LONG_POLL_MAX_WAIT, keepalive=SSE_KEEPALIVE):
+    from flask import Response, jsonify, request, stream_with_context
+
+    def describe(task_id, task, version):
+        task = {**task, "version": version}
+        if job_queue is not None and task.get('status') == 'queued':
+            task.update(job_queue.status(task_id) or {})
+        return task
+
+    @app.route('/task_status/<task_id>', methods=['GET'])
+    def get_task_status(task_id):
+        wait = min(max(request.args.get('wait', 0.0, type=float), 0.0), max_wait)
+        since = request.args.get('since', type=int)
+        if wait and since is None:
+            since = 0
+        task, version = tasks.wait(task_id, since if wait else None, wait)
+        if task is None:
+            return jsonify({"error": "Task not found"}), 404
+        return jsonify(describe(task_id, task, version)), 200
+
+    @app.route('/task_events/<task_id>', methods=['GET'])
+    def task_events(task_id):
+        since = request.headers.get('Last-Event-ID', 0, type=int)
+        if tasks.wait(task_id)[0] is None:
+            return jsonify({"error": "Task not found"}), 404
+
+        def stream():
+            last = since
+            while True:
+                task, version = tasks.wait(task_id, last, keepalive)
+                if task is None:
+                    yield f"event: error\ndata: {json.dumps({'error': 'Task not found'})}\n\n"
+                    return
+                if version > last:
+                    last = version
+                    yield f"id: {version}\nevent: status\ndata: {json.dumps(describe(task_id, task, version))}\n\n"
+                    if task.get('status') in FINISHED_STATUSES:
+                        return
+                elif task.get('status') in FINISHED_STATUSES:
+                    return
+                else:
+                    yield ": keep-alive\n\n"
+
+        return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return get_task_status, task_events
@@ -0,0 +1,301 @@
+"""비동기 작업 상태 저장소 (/task_status)
+
+기존 `tasks = {}` 는 모든 작업과 결과를 프로세스가 끝날 때까지 들고 있었습니다.
+저장소는 다음 한도를 지킵니다.
+
+- 완료/실패한 작업은 마지막 변경 후 ttl 초, 진행 중인 작업은 stale_ttl 초가 지나면 지웁니다
+  (worker 가 죽어 끝나지 않은 작업이 남지 않도록).
+- 항목 수(max_entries)나 JSON 기준 총 byte(max_bytes)를 넘으면 완료된 작업을 오래 조회되지 않은 순서로 지웁니다.
+  진행 중인 작업은 한도 때문에 지우지 않습니다.
+
+- MemoryTaskStore: 프로세스 안 OrderedDict + lock
+- SqliteTaskStore: sqlite 파일 하나 (WAL). 같은 포트 뒤의 여러 worker 프로세스가 상태를 공유할 수 있습니다.
+
+작업 상태는 JSON 으로 표현할 수 있는 dict 이며, get 은 복사본을 반환합니다.
+변경할 때마다 작업별 version 이 1 씩 늘고, wait(task_id, since, timeout) 은 version 이 since 보다
+커지거나 작업이 끝날 때까지 condition variable 로 기다립니다 (long-poll / SSE 용).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+FINISHED_STATUSES = ('completed', 'failed')
+DEFAULT_TTL = 3600.0  # 초
+DEFAULT_STALE_TTL = 24 * 3600.0
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_POLL_INTERVAL = 0.5  # 초, sqlite 에서 다른 프로세스의 변경을 확인하는 간격
+
+
+def _encode(task):
+    return json.dumps(task, default=str)
+
+
+class MemoryTaskStore:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 stale_ttl=DEFAULT_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # task_id -> {"task", "size", "expires_at", "version"}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.evicted = 0
+
+    def _expires_at(self, task, now):
+        return now + (self.ttl if task.get('status') in FINISHED_STATUSES else self.stale_ttl)
+
+    def _put(self, task_id, task, now):
+        previous = self._entries.pop(task_id, None)
+        if previous is not None:
+            self._bytes -= previous["size"]
+        # JSON 으로 한 번 직렬화해 크기를 재고, 저장된 상태가 호출자의 객체와 분리되도록 함
+        encoded = _encode(task)
+        self._entries[task_id] = {"task": json.loads(encoded), "size": len(encoded),
+                                  "expires_at": self._expires_at(task, now),
+                                  "version": previous["version"] + 1 if previous is not None else 1}
+        self._bytes += len(encoded)
+        self._changed.notify_all()
+
+    def _remove(self, task_id):
+        entry = self._entries.pop(task_id)
+        self._bytes -= entry["size"]
+        self.evicted += 1
+
+    def _evict(self, now):
+        for task_id in [task_id for task_id, entry in self._entries.items() if entry["expires_at"] <= now]:
+            self._remove(task_id)
+        if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        # 오래 조회되지 않은 완료 작업부터 (OrderedDict 앞쪽이 가장 오래됨)
+        for task_id in [task_id for task_id, entry in self._entries.items()
+                        if entry["task"].get('status') in FINISHED_STATUSES]:
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            self._remove(task_id)
+
+    def create(self, task_id, status='queued', **fields):
+        now = time.time()
+        with self._lock:
+            self._put(task_id, {'status': status, **fields}, now)
+            self._evict(now)
+
+    def update(self, task_id, changes):
+        """작업 상태에 changes 를 병합합니다. 이미 지워진 작업이면 changes 로 다시 만듭니다."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(task_id)
+            task = {**entry["task"], **changes} if entry is not None else dict(changes)
+            self._put(task_id, task, now)
+            self._evict(now)
+
+    def get(self, task_id):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= now:
+                self._remove(task_id)
+                return None
+            self._entries.move_to_end(task_id)
+            return json.loads(_encode(entry["task"]))
+
+    def wait(self, task_id, since=None, timeout=0.0):
+        """version 이 since 보다 커지거나 작업이 끝날 때까지 최대 timeout 초 기다립니다.
+
+        since 가 None 이면 기다리지 않습니다. (작업 복사본, version) 을 반환하며, 작업이 없으면 (None, 0) 입니다.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                entry = self._entries.get(task_id)
+                if entry is None or entry["expires_at"] <= time.time():
+                    return None, 0
+                remaining = deadline - time.monotonic()
+                if (since is None or entry["version"] > since or remaining <= 0
+                        or entry["task"].get('status') in FINISHED_STATUSES):
+                    self._entries.move_to_end(task_id)
+                    return json.loads(_encode(entry["task"])), entry["version"]
+                self._changed.wait(remaining)
+
+    def delete(self, task_id):
+        with self._lock:
+            if task_id in self._entries:
+                self._remove(task_id)
+                self._changed.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evicted": self.evicted}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    finished INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_expires_at ON tasks (expires_at);
+CREATE INDEX IF NOT EXISTS tasks_accessed_at ON tasks (finished, accessed_at);
+"""
+
+
+class SqliteTaskStore:
+    """여러 프로세스가 공유하는 sqlite 작업 저장소. 변경은 BEGIN IMMEDIATE 트랜잭션으로 직렬화합니다.
+
+    wait 은 이 프로세스의 변경은 condition variable 로 바로 깨어나고,
+    다른 프로세스의 변경은 poll_interval 초마다 다시 읽어 확인합니다.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 stale_ttl=DEFAULT_STALE_TTL, evict_every=32, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 한도 검사는 쓰기 evict_every 번마다 (만료 항목은 조회 시에도 걸러냄)
+        self.evict_every = evict_every
+        self._writes = 0
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self.evicted = 0
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _write(self, task_id, task, version, now):
+        encoded = _encode(task)
+        finished = task.get('status') in FINISHED_STATUSES
+        expires_at = now + (self.ttl if finished else self.stale_ttl)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task_id, encoded, len(encoded), int(finished), expires_at, now, version))
+
+    def _evict(self, now):
+        cursor = self.connection.execute("DELETE FROM tasks WHERE expires_at <= ?", (now,))
+        self.evicted += max(cursor.rowcount, 0)
+        count, total = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tasks").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        rows = self.connection.execute(
+            "SELECT task_id, size FROM tasks WHERE finished = 1 ORDER BY accessed_at").fetchall()
+        victims = []
+        for task_id, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((task_id,))
+            count -= 1
+            total -= size
+        self.connection.executemany("DELETE FROM tasks WHERE task_id = ?", victims)
+        self.evicted += len(victims)
+
+    def _transaction(self, task_id, build):
+        now = time.time()
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    "SELECT data, version FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+                previous, version = (json.loads(row[0]), row[1]) if row is not None else (None, 0)
+                self._write(task_id, build(previous), version + 1, now)
+                self._writes += 1
+                if self._writes % self.evict_every == 0:
+                    self._evict(now)
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        with self._changed:
+            self._changed.notify_all()
+
+    def create(self, task_id, status='queued', **fields):
+        self._transaction(task_id, lambda previous: {'status': status, **fields})
+
+    def update(self, task_id, changes):
+        """작업 상태에 changes 를 병합합니다. 이미 지워진 작업이면 changes 로 다시 만듭니다."""
+        self._transaction(task_id, lambda previous: {**(previous or {}), **changes})
+
+    def get(self, task_id):
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT data FROM tasks WHERE task_id = ? AND expires_at > ?", (task_id, now)).fetchone()
+            if row is None:
+                return None
+            # LRU 순서용 조회 시각 (실패해도 조회 결과에는 영향 없음)
+            try:
+                self.connection.execute("UPDATE tasks SET accessed_at = ? WHERE task_id = ?", (now, task_id))
+            except sqlite3.OperationalError:
+                pass
+        return json.loads(row[0])
+
+    def _read(self, task_id):
+        with self._lock:
+            return self.connection.execute(
+                "SELECT data, version FROM tasks WHERE task_id = ? AND expires_at > ?",
+                (task_id, time.time())).fetchone()
+
+    def wait(self, task_id, since=None, timeout=0.0):
+        """version 이 since 보다 커지거나 작업이 끝날 때까지 최대 timeout 초 기다립니다.
+
+        since 가 None 이면 기다리지 않습니다. (작업, version) 을 반환하며, 작업이 없으면 (None, 0) 입니다.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            row = self._read(task_id)
+            if row is None:
+                return None, 0
+            task, version = json.loads(row[0]), row[1]
+            remaining = deadline - time.monotonic()
+            if since is None or version > since or remaining <= 0 or task.get('status') in FINISHED_STATUSES:
+                return task, version
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def delete(self, task_id):
+        with self._lock:
+            self.connection.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+        with self._changed:
+            self._changed.notify_all()
+
+    def stats(self):
+        with self._lock:
+            count, total = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tasks").fetchone()
+        return {"entries": count, "bytes": total, "evicted": self.evicted}
+
+
+def create_task_store(prefix):
+    """환경 변수 `<prefix>_TASK_STORE` ('memory' / 'sqlite') 에 따라 저장소를 만듭니다. 기본값은 memory 입니다.
+
+    <prefix>_TASK_TTL_SECONDS, _TASK_STALE_TTL_SECONDS, _TASK_MAX_ENTRIES, _TASK_MAX_BYTES,
+    _TASK_STORE_PATH (sqlite 파일, 기본 `<prefix 소문자>_tasks.sqlite`) 로 한도를 조정합니다.
+    """
+    backend = os.getenv(f'{prefix}_TASK_STORE', 'memory').lower()
+    limits = {
+        "ttl": float(os.getenv(f'{prefix}_TASK_TTL_SECONDS', str(DEFAULT_TTL))),
+        "stale_ttl": float(os.getenv(f'{prefix}_TASK_STALE_TTL_SECONDS', str(DEFAULT_STALE_TTL))),
+        "max_entries": int(os.getenv(f'{prefix}_TASK_MAX_ENTRIES', str(DEFAULT_MAX_ENTRIES))),
+        "max_bytes": int(os.getenv(f'{prefix}_TASK_MAX_BYTES', str(DEFAULT_MAX_BYTES))),
+    }
+    if backend == 'memory':
+        return MemoryTaskStore(**limits)
+    if backend == 'sqlite':
+        return SqliteTaskStore(os.getenv(f'{prefix}_TASK_STORE_PATH', f'{prefix.lower()}_tasks.sqlite'), **limits)
+    raise ValueError(f"Unknown {prefix}_TASK_STORE backend: {backend}")